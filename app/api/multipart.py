@@ -0,0 +1,35 @@
+from typing import BinaryIO, Iterator, Optional, Tuple
+from werkzeug.sansio.multipart import Data, Epilogue, File, MultipartDecoder, NeedData
+
+READ_SIZE = 1024 * 1024
+
+
+def _events(stream: BinaryIO, decoder: MultipartDecoder) -> Iterator[object]:
+    while True:
+        event = decoder.next_event()
+        if isinstance(event, NeedData):
+            data = stream.read(READ_SIZE)
+            decoder.receive_data(data or None)
+        elif isinstance(event, Epilogue):
+            return
+        else:
+            yield event
+
+
+# Streams the file part without spooling it
+def open_multipart_file(stream: BinaryIO, boundary: str, field_name: str) -> Optional[Tuple[str, Iterator[bytes]]]:
+    events = _events(stream, MultipartDecoder(boundary.encode("latin-1")))
+
+    for event in events:
+        if isinstance(event, File) and event.name == field_name:
+            def file_data() -> Iterator[bytes]:
+                for data_event in events:
+                    if not isinstance(data_event, Data):
+                        return
+                    if data_event.data:
+                        yield data_event.data
+                    if not data_event.more_data:
+                        return
+
+            return event.filename, file_data()
+    return None
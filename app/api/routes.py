@@ -1,13 +1,19 @@
 import os
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, g
 from integration.cosmos_db import CosmosDB
+from integration.artifact_cache import get_artifact_cache
+from integration.openai_pool import get_openai_pool
 from ingestion.audio_processor import AudioFileProcessor, start_queue_processing
 from query.chat_service import ChatService
+from query.local_retrieval import get_local_retriever, local_retrieval_enabled
+from query.timeline_index import TimelineIndex, parse_offset
+from api.multipart import open_multipart_file
 import asyncio
 from azure.identity import DefaultAzureCredential
 import threading
-from azure.storage.blob import BlobServiceClient, ContainerClient
-import io
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceNotFoundError
+import re
 from flask import Response
 
 api = Blueprint('api', __name__)
@@ -15,14 +21,25 @@ credential = DefaultAzureCredential()
 cosmos_db = CosmosDB()
 audio_processor = AudioFileProcessor()
 chat_service = ChatService()
+timeline_index = TimelineIndex(cosmos_db)
+
+@api.before_request
+def open_cosmos_request_scope():
+    g.cosmos_request_scope = cosmos_db.read_cache.begin_request_scope()
+
+@api.teardown_request
+def close_cosmos_request_scope(exception=None):
+    cosmos_db.read_cache.end_request_scope(g.pop('cosmos_request_scope', None))
 
 def run_queue_processing():
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
     loop.run_until_complete(start_queue_processing())
 
-queue_thread = threading.Thread(target=run_queue_processing)
-queue_thread.start()
+# Set INGESTION_IN_WEB_CONSUMER=false when ingestion runs in dedicated `python -m ingestion.worker` pods
+if os.getenv("INGESTION_IN_WEB_CONSUMER", "true").lower() == "true":
+    queue_thread = threading.Thread(target=run_queue_processing, daemon=True)
+    queue_thread.start()
 
 @api.route('/cases', methods=['GET'])
 def get_cases():
@@ -50,22 +67,24 @@ def get_case(case_id):
     return jsonify({"error": "Case not found"}), 404
 
 @api.route('/cases/<case_id>/upload', methods=['POST'])
-async def upload_file(case_id):
-    if 'file' not in request.files:
+def upload_file(case_id):
+    boundary = request.mimetype_params.get('boundary')
+    if request.mimetype != 'multipart/form-data' or not boundary:
+        return jsonify({"error": "No file part"}), 400
+    upload = open_multipart_file(request.stream, boundary, 'file')
+    if upload is None:
         return jsonify({"error": "No file part"}), 400
-    file = request.files['file']
-    if file.filename == '':
+    filename, file_data = upload
+    filename = os.path.basename(filename or '')
+    if filename == '':
         return jsonify({"error": "No selected file"}), 400
-    if not file.filename.lower().endswith('.mp3'):
+    if not filename.lower().endswith('.mp3'):
         return jsonify({"error": "Only MP3 files are allowed"}), 400
     
     try:
-        temp_file_path = f"/tmp/{file.filename}"
-        file.save(temp_file_path)
-        blob_url = await audio_processor.upload_audio_file(temp_file_path, case_id)
-        os.remove(temp_file_path)
+        blob_url, _ = audio_processor.upload_audio_stream(file_data, case_id, filename)
 
-        audio_processor.queue_audio_processing(case_id, file.filename, blob_url)
+        audio_processor.queue_audio_processing(case_id, filename, blob_url)
         
         cosmos_db.update_case_status(case_id, "queued")
 
@@ -76,31 +95,34 @@ async def upload_file(case_id):
 
 @api.route('/cases/<case_id>/files', methods=['GET'])
 def get_files(case_id):
-    case = cosmos_db.get_case(case_id)
-    if not case:
+    try:
+        offset = int(request.args.get('offset', 0))
+        limit = int(request.args['limit']) if 'limit' in request.args else None
+    except ValueError:
+        return jsonify({"error": "offset and limit must be integers"}), 400
+    if offset < 0 or (limit is not None and limit < 0):
+        return jsonify({"error": "offset and limit must not be negative"}), 400
+    include_transcripts = request.args.get('include_transcripts', 'true').lower() != 'false'
+
+    files_info = cosmos_db.get_files_info(case_id, offset, limit, include_transcripts)
+    if files_info is None:
         return jsonify({"error": "Case not found"}), 404
     
-    files_info = []
-    for filename in case.get('files', []):
-        file_info = {
-            'filename': filename,
-            'summary': cosmos_db.get_summary(case_id, filename),
-            'full_transcript': cosmos_db.get_full_transcript(case_id, filename)
-        }
-        files_info.append(file_info)
-    
     return jsonify(files_info), 200
 
 @api.route('/cases/<case_id>/files', methods=['DELETE'])
 async def delete_all_files(case_id):
-    case = cosmos_db.get_case(case_id)
+    case = cosmos_db.get_case_header(case_id)
     if not case:
         return jsonify({"error": "Case not found"}), 404
     
     success = await audio_processor.delete_all_audio_files(case_id)
     if success:
-        cosmos_db.update_case(case_id, {'files': []})
-        cosmos_db.update_graph(case_id, {"nodes": [], "relationships": []})
+        cosmos_db.update_case(case_id, {'files': [], 'file_count': 0})
+        cosmos_db.bump_index_version(case_id)
+        cosmos_db.delete_file_documents(case_id)
+        if local_retrieval_enabled():
+            get_local_retriever().delete_case(case_id)
         return jsonify({"message": "All files deleted and reindexing initiated"}), 200
     return jsonify({"error": "Failed to delete files"}), 500
 
@@ -111,9 +133,22 @@ async def chat(case_id):
     if not messages or not isinstance(messages, list):
         return jsonify({"error": "Invalid messages format"}), 400
     
-    response = chat_service.chat_with_data(messages, case_id)
+    response = chat_service.chat_with_data(messages, case_id, cosmos_db.get_index_version(case_id))
     return response
 
+@api.route('/cases/<case_id>/chat/stream', methods=['POST'])
+def chat_stream(case_id):
+    data = request.get_json(silent=True) or {}
+    messages = data.get('messages')
+    if not messages or not isinstance(messages, list):
+        return jsonify({"error": "Invalid messages format"}), 400
+
+    return Response(
+        chat_service.stream_chat_with_data(messages, case_id, cosmos_db.get_index_version(case_id)),
+        content_type='application/x-ndjson',
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @api.route('/cases/<case_id>/refine', methods=['POST'])
 async def refine(case_id):
     data = request.json
@@ -123,14 +158,18 @@ async def refine(case_id):
     if not message or not citations or not original_question:
         return jsonify({"error": "Message, citations, and original question are required"}), 400
     
-    response = await chat_service.refine_message(message, citations, case_id, True, original_question)
-    return jsonify(response), 200
+    return chat_service.refine_message({
+        "message": message,
+        "citations": citations,
+        "index_name": f"{case_id}-ingestion",
+        "original_question": original_question
+    })
 
 @api.route('/cases/<case_id>/status', methods=['GET'])
 def get_case_status(case_id):
-    case = cosmos_db.get_case(case_id)
-    if case:
-        return jsonify({"status": case.get('status', 'unknown')}), 200
+    status = cosmos_db.get_case_status(case_id)
+    if status:
+        return jsonify({"status": status}), 200
     return jsonify({"error": "Case not found"}), 404
 
 @api.route('/dashboard', methods=['GET'])
@@ -143,27 +182,83 @@ def get_dashboard():
         "total_minutes_ingested": total_minutes
     }), 200
 
+@api.route('/metrics', methods=['GET'])
+def get_metrics():
+    return jsonify({
+        "cosmos_read_cache": cosmos_db.cache_stats(),
+        "artifact_cache": get_artifact_cache().stats(),
+        "openai": get_openai_pool().stats(),
+        "chat_response_cache": chat_service.response_cache.stats(),
+        "timeline_index": timeline_index.stats()
+    }), 200
+
+def parse_range_header(range_header: str, size: int):
+    # None serves the full body; an unsatisfiable range raises ValueError
+    match = re.fullmatch(r"bytes=(\d*)-(\d*)", range_header.strip())
+    if not match or not any(match.groups()):
+        return None
+    start, end = match.groups()
+    if start == "":
+        length = min(int(end), size)
+        if not length:
+            raise ValueError(f"Unsatisfiable range: {range_header}")
+        return size - length, size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        raise ValueError(f"Unsatisfiable range: {range_header}")
+    return start, end
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    def opaque(tag: str) -> str:
+        tag = tag.strip()
+        return tag[2:] if tag.startswith('W/') else tag
+
+    tags = {opaque(tag) for tag in if_none_match.split(',')}
+    return '*' in tags or opaque(etag) in tags
+
 @api.route('/cases/<case_id>/audio/<filename>', methods=['GET'])
 def get_audio_file(case_id, filename):
     try:
-        blob_service_client = BlobServiceClient(
-            account_url=f"https://{audio_processor.storage_account_name}.blob.core.windows.net",
-            credential=audio_processor.storage_account_key
-        )
+        blob_client = audio_processor.blob_service_client.get_blob_client(container=case_id, blob=filename)
+        properties = blob_client.get_blob_properties()
+        size = properties.size
+        etag = properties.etag
 
-        container_client = blob_service_client.get_container_client(case_id)
-        blob_client = container_client.get_blob_client(filename)
-        download_stream = blob_client.download_blob()
+        headers = {
+            "Content-Disposition": f"attachment; filename={filename}",
+            "Accept-Ranges": "bytes",
+            "ETag": etag,
+        }
+        if etag_matches(request.headers.get('If-None-Match', ''), etag):
+            return Response(status=304, headers=headers)
 
-        audio_data = io.BytesIO()
-        download_stream.readinto(audio_data)
-        audio_data.seek(0)
+        status = 200
+        offset, length = 0, size
+        range_header = request.headers.get('Range')
+        if range_header:
+            try:
+                byte_range = parse_range_header(range_header, size)
+            except ValueError:
+                return Response(status=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+            if byte_range is not None:
+                offset, end = byte_range
+                length = end - offset + 1
+                status = 206
+                headers["Content-Range"] = f"bytes {offset}-{end}/{size}"
+        headers["Content-Length"] = str(length)
 
+        download_stream = blob_client.download_blob(offset=offset, length=length, etag=etag,
+                                                    match_condition=MatchConditions.IfNotModified)
         return Response(
-            audio_data,
+            download_stream.chunks(),
+            status=status,
             mimetype="audio/mpeg",
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
+            headers=headers,
+            direct_passthrough=True
         )
+    except ResourceNotFoundError:
+        return jsonify({"error": "Audio file not found"}), 404
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -176,7 +271,59 @@ def get_file_summary(case_id, filename):
 
 @api.route('/cases/<case_id>/files/<filename>/transcript', methods=['GET'])
 def get_file_transcript(case_id, filename):
+    # ?from=..&to=.. (seconds or HH:MM:SS) returns only the cues overlapping that window
+    if 'from' in request.args or 'to' in request.args:
+        try:
+            from_ms = parse_offset(request.args.get('from', '0'))
+            to_ms = parse_offset(request.args['to']) if 'to' in request.args else from_ms + 60000
+        except ValueError:
+            return jsonify({"error": "from and to must be seconds or HH:MM:SS"}), 400
+        if to_ms < from_ms:
+            return jsonify({"error": "to must not be before from"}), 400
+        segments = timeline_index.transcript_window(case_id, filename, from_ms, to_ms)
+        if segments is None:
+            return jsonify({"error": "Transcript not found"}), 404
+        return jsonify({"filename": filename, "from_ms": from_ms, "to_ms": to_ms, "segments": segments}), 200
+
     transcript = cosmos_db.get_full_transcript(case_id, filename)
     if transcript:
         return jsonify({"transcript": transcript}), 200
-    return jsonify({"error": "Transcript not found"}), 404
\ No newline at end of file
+    return jsonify({"error": "Transcript not found"}), 404
+
+@api.route('/cases/<case_id>/entities/<path:entity>/mentions', methods=['GET'])
+def get_entity_mentions(case_id, entity):
+    try:
+        context_ms = parse_offset(request.args.get('context', '15'))
+    except ValueError:
+        return jsonify({"error": "context must be seconds"}), 400
+    if cosmos_db.get_index_version(case_id) is None:
+        return jsonify({"error": "Case not found"}), 404
+    return jsonify({"entity": entity, "mentions": timeline_index.entity_mentions(case_id, entity, context_ms)}), 200
+
+@api.route('/cases/<case_id>/files/<filename>/retry', methods=['POST'])
+def retry_file(case_id, filename):
+    # {"restart": true} discards the checkpoints
+    restart = bool((request.get_json(silent=True) or {}).get('restart', False))
+    blob_client = audio_processor.blob_service_client.get_blob_client(container=case_id, blob=filename)
+    try:
+        blob_client.get_blob_properties()
+    except ResourceNotFoundError:
+        return jsonify({"error": "File not found"}), 404
+
+    try:
+        audio_processor.queue_audio_processing(case_id, filename, blob_client.url, restart)
+        cosmos_db.update_case_status(case_id, "queued")
+        return jsonify({"message": "File queued for reprocessing", "restart": restart}), 202
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@api.route('/cases/<case_id>/jobs', methods=['GET'])
+def get_jobs(case_id):
+    return jsonify(cosmos_db.list_jobs(case_id)), 200
+
+@api.route('/cases/<case_id>/files/<filename>/job', methods=['GET'])
+def get_file_job(case_id, filename):
+    job = cosmos_db.get_job(case_id, filename)
+    if job:
+        return jsonify(job), 200
+    return jsonify({"error": "Job not found"}), 404
@@ -1,17 +1,29 @@
 import os
+import time
+import uuid
+import base64
 import asyncio
-from typing import Dict, Any, List
-from azure.storage.blob import BlobServiceClient, ContainerClient
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Awaitable, Callable, Iterable, List, Optional, Tuple
+from azure.storage.blob import BlobServiceClient, ContainerClient, BlobBlock, ContentSettings
 from azure.core.exceptions import ResourceExistsError
-from azure.storage.queue import QueueClient
+from azure.storage.queue import QueueClient, QueueMessage
 from ingestion.transcription import TranscriptionService
+from ingestion.checkpoints import CheckpointStore
+from ingestion.ingestion_scheduler import IngestionJobScheduler
 from ingestion.graph_generator import GraphGenerator
 from ingestion.summary_generator import SummaryGenerator
+from ingestion.pipeline import PipelineExecutor, Stage, StageResults
+from ingestion.segment_store import SegmentStore
+from ingestion.srt import SegmentTable, segment_table
 from integration.cosmos_db import CosmosDB
+from integration.artifact_cache import get_artifact_cache
+from query.local_retrieval import get_local_retriever, local_retrieval_enabled
 from dotenv import load_dotenv
 import json
+import hashlib
 import logging
-import tempfile
 import requests
 
 load_dotenv()
@@ -19,6 +31,9 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+BLOB_STREAM_CHUNK_SIZE = 4 * 1024 * 1024
+UPLOAD_BLOCK_SIZE = 8 * 1024 * 1024
+
 
 class IngestionJobApi:
     def __init__(self):
@@ -53,6 +68,14 @@ class IngestionJobApi:
         response = requests.put(url, headers=headers, json=payload)
         return {"status": "initiated", "job_id": container_name, "message": "Indexing job initiated successfully"} if response.status_code == 200 else {"status": "error", "message": f"Failed to create ingestion job: {response.text}"}
 
+    def get_ingestion_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        url = f"{self.openai_endpoint}/openai/ingestion/jobs/{job_id}?api-version=2024-05-01-preview"
+        response = requests.get(url, headers={'api-key': self.aoai_api_key})
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.json()
+
 
 class AudioFileProcessor:
     def __init__(self):
@@ -60,30 +83,56 @@ class AudioFileProcessor:
         self.storage_account_key = os.getenv('STORAGE_ACCOUNT_KEY')
         self.queue_name = "audio-processing-queue"
 
+        account_url = f"https://{self.storage_account_name}.blob.core.windows.net"
         self.blob_service_client = BlobServiceClient(
-            account_url=f"https://{self.storage_account_name}.blob.core.windows.net",
-            credential=self.storage_account_key
+            account_url=account_url,
+            credential=self.storage_account_key,
+            max_single_get_size=BLOB_STREAM_CHUNK_SIZE,
+            max_chunk_get_size=BLOB_STREAM_CHUNK_SIZE
+        )
+        self.segment_store = SegmentStore(account_url, self.storage_account_key)
+        self.checkpoints = CheckpointStore(
+            self.blob_service_client, os.getenv("INGESTION_CHECKPOINT_CONTAINER", "ingestion-checkpoints")
         )
+        self.poison_queue_name = f"{self.queue_name}-poison"
+        queue_connection_string = f"DefaultEndpointsProtocol=https;AccountName={self.storage_account_name};AccountKey={self.storage_account_key};EndpointSuffix=core.windows.net"
         self.queue_client = QueueClient.from_connection_string(
-            conn_str=f"DefaultEndpointsProtocol=https;AccountName={self.storage_account_name};AccountKey={self.storage_account_key};EndpointSuffix=core.windows.net",
+            conn_str=queue_connection_string,
             queue_name=self.queue_name
         )
+        self.poison_queue_client = QueueClient.from_connection_string(
+            conn_str=queue_connection_string,
+            queue_name=self.poison_queue_name
+        )
+
+        self.queue_concurrency = int(os.getenv("QUEUE_CONCURRENCY", "4"))
+        self.batch_size = min(int(os.getenv("QUEUE_BATCH_SIZE", "16")), 32)
+        self.visibility_timeout = int(os.getenv("QUEUE_VISIBILITY_TIMEOUT", "300"))
+        self.max_dequeue_count = int(os.getenv("QUEUE_MAX_DEQUEUE_COUNT", "5"))
+        self.min_poll_interval = float(os.getenv("QUEUE_MIN_POLL_SECONDS", "1"))
+        self.max_poll_interval = float(os.getenv("QUEUE_MAX_POLL_SECONDS", "30"))
 
         self.transcription_service = TranscriptionService()
         self.graph_generator = GraphGenerator()
         self.ingestion_job_api = IngestionJobApi()
+        self.ingestion_scheduler = IngestionJobScheduler(self.ingestion_job_api, self._on_ingestion_batch_done)
+        self.ingestion_drain_seconds = float(os.getenv("INGESTION_JOB_DRAIN_SECONDS", "60"))
         self.summary_generator = SummaryGenerator()
         self.cosmos_db = CosmosDB()
 
+        self.upload_concurrency = int(os.getenv("UPLOAD_CONCURRENCY", "8"))
+        self.upload_executor = ThreadPoolExecutor(max_workers=self.upload_concurrency, thread_name_prefix="blob-upload")
+
         self.is_processing = False
 
         self.initialize_azure_resources()
 
     def initialize_azure_resources(self):
-        try:
-            self.queue_client.create_queue()
-        except ResourceExistsError:
-            pass
+        for queue_client in (self.queue_client, self.poison_queue_client):
+            try:
+                queue_client.create_queue()
+            except ResourceExistsError:
+                pass
 
     def ensure_container_exists(self, container_name: str) -> ContainerClient:
         container_client = self.blob_service_client.get_container_client(container_name)
@@ -94,96 +143,221 @@ class AudioFileProcessor:
         return container_client
 
     async def upload_audio_file(self, file_path: str, case_id: str) -> str:
-        file_name = os.path.basename(file_path)
-        container_client = self.ensure_container_exists(case_id)
-        blob_client = container_client.get_blob_client(file_name)
-        
         with open(file_path, "rb") as data:
-            blob_client.upload_blob(data, overwrite=True)
-        
-        return blob_client.url
-
-    async def process_audio_file(self, case_id: str, filename: str, blob_url: str):
-        try:
-            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".mp3")
-            temp_file.close()
-            
-            blob_client = self.blob_service_client.get_blob_client(container=case_id, blob=filename)
-            with open(temp_file.name, "wb") as file:
-                blob_data = blob_client.download_blob()
-                file.write(blob_data.readall())
-
-            logger.info(f"Blob downloaded to temporary file: {temp_file.name}")
-
-            transcription = await self.transcription_service.transcribe_audio(temp_file.name)
-            if not transcription:
-                raise ValueError("Transcription is empty")
+            blob_url, _ = self.upload_audio_stream(
+                iter(lambda: data.read(UPLOAD_BLOCK_SIZE), b""), case_id, os.path.basename(file_path)
+            )
+        return blob_url
 
-            logger.info("Audio file transcribed")
-
-            os.unlink(temp_file.name)
-            logger.info("Temporary file removed")
-
-            for chunk in transcription:
-                chunk['filename'] = filename
-
-            summary = await self.summary_generator.generate_summary(transcription)
-            full_transcript = self.transcription_service.get_full_transcript(transcription)
-
-            await self.store_transcription_by_minute(case_id, filename, transcription)
-            await self.store_summary_and_transcript(case_id, filename, summary, full_transcript)
-            logger.info("Transcription, summary, and full transcript stored")
+    def upload_audio_stream(self, chunks: Iterable[bytes], case_id: str, filename: str) -> Tuple[str, str]:
+        container_client = self.ensure_container_exists(case_id)
+        blob_client = container_client.get_blob_client(filename)
+
+        audio_hash = hashlib.sha256()
+        in_flight = threading.BoundedSemaphore(self.upload_concurrency)
+        futures = []
+        block_ids = []
+        upload_id = uuid.uuid4().hex
+
+        def stage(block_id: str, block: bytes):
+            try:
+                blob_client.stage_block(block_id, block)
+            finally:
+                in_flight.release()
+
+        def submit(block: bytes):
+            # Waits for a free slot, so at most `upload_concurrency` blocks are buffered
+            in_flight.acquire()
+            block_id = base64.b64encode(f"{upload_id}-{len(block_ids):08d}".encode()).decode()
+            block_ids.append(block_id)
+            futures.append(self.upload_executor.submit(stage, block_id, block))
 
-            ingestion_container = f"{case_id}-ingestion"
-            self.ensure_container_exists(ingestion_container)
-            job_result = self.ingestion_job_api.create_ingestion_job(ingestion_container)
-            
-            if job_result["status"] == "error":
-                raise Exception(f"Failed to create ingestion job: {job_result['message']}")
+        try:
+            block = bytearray()
+            for chunk in chunks:
+                audio_hash.update(chunk)
+                block += chunk
+                while len(block) >= UPLOAD_BLOCK_SIZE:
+                    submit(bytes(block[:UPLOAD_BLOCK_SIZE]))
+                    del block[:UPLOAD_BLOCK_SIZE]
+            if block:
+                submit(bytes(block))
+
+            for future in futures:
+                future.result()
+        except Exception:
+            for future in futures:
+                future.cancel()
+            raise
 
-            logger.info("Ingestion job created") 
-            await self.update_knowledge_graph(case_id, transcription)
-            logger.info("Knowledge graph updated")
+        blob_client.commit_block_list(
+            [BlobBlock(block_id=block_id) for block_id in block_ids],
+            content_settings=ContentSettings(content_type="audio/mpeg"),
+            metadata={"sha256": audio_hash.hexdigest()}
+        )
+        return blob_client.url, audio_hash.hexdigest()
 
-            self.cosmos_db.update_case(case_id, {'files': self.cosmos_db.get_case(case_id).get('files', []) + [filename]})
+    def _build_pipeline(self, case_id: str, filename: str, audio_hash: Optional[str]) -> List[Stage]:
+        ingestion_container = f"{case_id}-ingestion"
 
-            logger.info(f"Successfully processed audio file: {filename} for case: {case_id}")
-            logger.info(f"Ingestion job created: {job_result}")
+        async def transcribe(results: StageResults) -> List[Dict[str, Any]]:
+            blob_client = self.blob_service_client.get_blob_client(container=case_id, blob=filename)
+            blob_stream = await asyncio.to_thread(blob_client.download_blob)
+            logger.info(f"Streaming blob {filename} into transcription")
 
+            transcription = await self.transcription_service.transcribe_audio(blob_stream, audio_hash)
+            if not transcription:
+                raise ValueError("Transcription is empty")
+            return transcription
+
+        async def parse(results: StageResults) -> SegmentTable:
+            return segment_table(results["transcribe"], filename)
+
+        async def summarize(results: StageResults) -> str:
+            return await self.summary_generator.generate_summary(results["parse"])
+
+        async def store_segments(results: StageResults) -> None:
+            await self.store_transcription_by_minute(case_id, filename, results["parse"])
+
+        async def store_summary(results: StageResults) -> None:
+            full_transcript = self.transcription_service.get_full_transcript(results["parse"])
+            await asyncio.to_thread(self.store_summary_and_transcript, case_id, filename, results["summary"], full_transcript)
+
+        async def build_graph(results: StageResults) -> None:
+            await self.update_knowledge_graph(case_id, filename, results["parse"])
+
+        async def schedule_ingestion_job(results: StageResults) -> Dict[str, Any]:
+            await asyncio.to_thread(self.ensure_container_exists, ingestion_container)
+            await asyncio.to_thread(self.cosmos_db.update_job_stage, case_id, filename, "search_index",
+                                    {"status": "scheduled", "scheduled_at": time.time()})
+            return self.ingestion_scheduler.schedule(case_id, filename)
+
+        async def register_file(results: StageResults) -> None:
+            await asyncio.to_thread(self.cosmos_db.add_file_to_case, case_id, filename)
+
+        def checkpointed(stage: str, run: Callable[[StageResults], Awaitable[Any]]) -> Callable[[StageResults], Awaitable[Any]]:
+            async def run_and_save(results: StageResults) -> Any:
+                output = await run(results)
+                await asyncio.to_thread(self.checkpoints.save, case_id, filename, stage, output)
+                return output
+            return run_and_save
+
+        # The search ingestion job is per case: this only schedules the file and is never checkpointed
+        return [
+            Stage("transcribe", checkpointed("transcribe", transcribe)),
+            Stage("parse", parse, ["transcribe"]),
+            Stage("summary", checkpointed("summary", summarize), ["parse"]),
+            Stage("segments", checkpointed("segments", store_segments), ["parse"]),
+            Stage("store_summary", checkpointed("store_summary", store_summary), ["parse", "summary"]),
+            Stage("graph", checkpointed("graph", build_graph), ["parse"]),
+            Stage("ingestion_job", schedule_ingestion_job, ["segments", "store_summary"]),
+            Stage("register_file", register_file, ["store_summary", "graph", "ingestion_job"]),
+        ]
+
+    def _load_checkpoints(self, case_id: str, filename: str, source_version: Optional[str],
+                          stages: List[Stage]) -> Tuple[StageResults, Dict[str, Dict[str, Any]], int]:
+        job = self.cosmos_db.get_job(case_id, filename)
+        if not job:
+            return {}, {}, 1
+        attempt = (job.get("attempt") or 0) + 1
+        # Checkpoints only apply to the exact audio they were produced from
+        if job.get("status") == "completed" or source_version is None or job.get("source_version") != source_version:
+            return {}, {}, attempt
+
+        results, resumed_stages = {}, {}
+        stage_records = job.get("stages") or {}
+        for stage in stages:
+            record = stage_records.get(stage.name) or {}
+            if record.get("status") != "completed":
+                continue
+            try:
+                results[stage.name] = self.checkpoints.load(case_id, filename, stage.name)
+            except Exception as e:
+                logger.warning(f"Checkpoint of stage {stage.name} for {filename} is unavailable: {str(e)}")
+                continue
+            resumed_stages[stage.name] = dict(record, resumed=True)
+        return results, resumed_stages, attempt
+
+    async def process_audio_file(self, case_id: str, filename: str, blob_url: str, restart: bool = False):
+        started = time.time()
+        try:
+            blob_client = self.blob_service_client.get_blob_client(container=case_id, blob=filename)
+            properties = await asyncio.to_thread(blob_client.get_blob_properties)
+            audio_hash = properties.metadata.get("sha256")
+            source_version = audio_hash or properties.etag
+
+            stages = self._build_pipeline(case_id, filename, audio_hash)
+            if restart:
+                await asyncio.to_thread(self.checkpoints.delete, case_id, filename)
+                results, resumed_stages, attempt = {}, {}, 1
+            else:
+                results, resumed_stages, attempt = await asyncio.to_thread(
+                    self._load_checkpoints, case_id, filename, source_version, stages
+                )
+            if results:
+                logger.info(f"Resuming {filename} for case {case_id} after stages: {', '.join(results)}")
+
+            def record_stage(stage: str, record: Dict[str, Any]):
+                if record.get("cached"):
+                    return
+                self.cosmos_db.update_job_stage(case_id, filename, stage, record)
+
+            await asyncio.to_thread(
+                self.cosmos_db.create_job, case_id, filename, [stage.name for stage in stages],
+                source_version, resumed_stages, attempt
+            )
+            results = await PipelineExecutor(stages, record_stage).run(results)
         except Exception as e:
             logger.error(f"Error processing audio file {filename} for case {case_id}: {str(e)}")
-            self.cosmos_db.update_case_status(case_id, "error")
-        
-        logger.info(f"Processing status for case {case_id}: completed")
+            await asyncio.to_thread(self._finish_job, case_id, filename, "failed", started)
+            await asyncio.to_thread(self.cosmos_db.update_case_status, case_id, "error")
+            raise
 
-    async def store_transcription_by_minute(self, case_id: str, filename: str, transcription: List[Dict[str, Any]]):
-        ingestion_container = f"{case_id}-ingestion"
-        container_client = self.ensure_container_exists(ingestion_container)
+        await asyncio.to_thread(self._finish_job, case_id, filename, "completed", started)
+        try:
+            await asyncio.to_thread(self.checkpoints.delete, case_id, filename)
+        except Exception as e:
+            logger.warning(f"Could not delete checkpoints for {filename}: {str(e)}")
+
+        logger.info(f"Successfully processed audio file: {filename} for case: {case_id} "
+                    f"in {int((time.time() - started) * 1000)} ms")
+        logger.info(f"Ingestion job scheduled: {results['ingestion_job']}")
+        logger.info(f"Artifact cache stats: {get_artifact_cache().stats()}")
+
+    def _on_ingestion_batch_done(self, case_id: str, filenames: List[str], result: Dict[str, Any]):
+        logger.info(f"Ingestion job {result['job_id']} {result['status']} for {len(filenames)} files in {result['duration_ms']} ms")
+        if result["status"] == "succeeded":
+            self.cosmos_db.bump_index_version(case_id)
+        for filename in filenames:
+            try:
+                self.cosmos_db.update_job_stage(case_id, filename, "search_index", dict(result, finished_at=time.time()))
+            except Exception as e:
+                logger.warning(f"Could not record search index status for {filename}: {str(e)}")
+
+    async def _recover_ingestion_batches(self):
+        try:
+            pending = await asyncio.to_thread(self.cosmos_db.list_pending_ingestions)
+        except Exception as e:
+            logger.warning(f"Could not list files waiting for an ingestion job: {str(e)}")
+            return
+        for item in pending:
+            self.ingestion_scheduler.schedule(item["case_id"], item["filename"])
+        if pending:
+            logger.info(f"Rescheduled ingestion jobs for {len(pending)} files")
+
+    def _finish_job(self, case_id: str, filename: str, status: str, started: float):
+        try:
+            self.cosmos_db.finish_job(case_id, filename, status, int((time.time() - started) * 1000))
+        except Exception as e:
+            logger.warning(f"Could not record {status} job for {filename}: {str(e)}")
 
-        for segment in transcription:
-            if 'transcription' in segment:
-                lines = segment['transcription'].split('\n')
-                i = 0
-                while i < len(lines):
-                    if '-->' in lines[i]:
-                        time_range = lines[i]
-                        start_time = time_range.split(' --> ')[0]
-                        minutes, seconds = start_time.split(':')[1:3]
-                        seconds = seconds.split(',')[0]
-                        
-                        blob_name = f"{filename}__min{int(minutes):02d}_{int(seconds):02d}.txt"
-                        blob_client = container_client.get_blob_client(blob_name)
-                        
-                        text = lines[i+1] if i+1 < len(lines) else ""
-                        content = f"Time: {time_range}\nText: {text}\n"
-                        blob_client.upload_blob(content, overwrite=True)
-                        
-                        i += 2
-                    else:
-                        i += 1
+    async def store_transcription_by_minute(self, case_id: str, filename: str, segments: SegmentTable):
+        documents = await self.segment_store.store(f"{case_id}-ingestion", filename, segments)
+        if local_retrieval_enabled():
+            await asyncio.to_thread(get_local_retriever().index_file, case_id, filename, documents)
         logger.info(f"Transcription stored by time segments for case {case_id}")
 
-    async def store_summary_and_transcript(self, case_id: str, filename: str, summary: str, full_transcript: str):
+    def store_summary_and_transcript(self, case_id: str, filename: str, summary: str, full_transcript: str):
         ingestion_container = f"{case_id}-ingestion"
         container_client = self.ensure_container_exists(ingestion_container)
 
@@ -197,45 +371,131 @@ class AudioFileProcessor:
 
         self.cosmos_db.add_summary_and_transcript(case_id, filename, summary, full_transcript)
 
-    async def update_knowledge_graph(self, case_id: str, transcription: List[Dict[str, Any]]):
+    async def update_knowledge_graph(self, case_id: str, filename: str, segments: SegmentTable):
         try:
-            current_graph = self.cosmos_db.get_graph(case_id) or {"nodes": [], "relationships": [], "timecodes": {}}
-            updated_graph = await self.graph_generator.generate_graph(transcription, case_id)
-            self.cosmos_db.update_graph(case_id, updated_graph)
-            logger.info(f"Successfully updated knowledge graph for case: {case_id}")
+            current_graph = await asyncio.to_thread(self.cosmos_db.get_graph, case_id)
+            file_graph = await self.graph_generator.generate_graph(segments, case_id, current_graph)
+            await asyncio.to_thread(self.cosmos_db.save_file_graph, case_id, filename, file_graph)
+            logger.info(f"Successfully updated knowledge graph for case: {case_id} "
+                        f"({len(file_graph['nodes'])} nodes, {len(file_graph['relationships'])} relationships from {filename})")
         except Exception as e:
             logger.error(f"Error updating knowledge graph for case {case_id}: {str(e)}")
             raise
 
-    def queue_audio_processing(self, case_id: str, filename: str, blob_url: str):
-        message_content = json.dumps({"case_id": case_id, "filename": filename, "blob_url": blob_url})
+    def queue_audio_processing(self, case_id: str, filename: str, blob_url: str, restart: bool = False):
+        message_content = json.dumps({"case_id": case_id, "filename": filename, "blob_url": blob_url, "restart": restart})
         self.queue_client.send_message(message_content)
 
-    async def process_queue(self):
-        logger.info("Processing queue")
+    def _receive_batch(self, max_messages: int) -> List[QueueMessage]:
+        return list(self.queue_client.receive_messages(
+            messages_per_page=max_messages,
+            max_messages=max_messages,
+            visibility_timeout=self.visibility_timeout
+        ))
+
+    async def _renew_visibility(self, message: QueueMessage, lease: Dict[str, str], stop: asyncio.Event):
+        # Stopped through `stop`, not cancelled, so a renewed pop receipt isn't lost
+        while True:
+            try:
+                await asyncio.wait_for(stop.wait(), self.visibility_timeout / 2)
+                return
+            except asyncio.TimeoutError:
+                pass
+            try:
+                receipt = await asyncio.to_thread(
+                    self.queue_client.update_message, message.id, lease["pop_receipt"],
+                    visibility_timeout=self.visibility_timeout
+                )
+            except Exception as e:
+                logger.warning(f"Could not renew visibility of message {message.id}: {str(e)}")
+                return
+            lease["pop_receipt"] = receipt.pop_receipt
+
+    async def _dead_letter(self, message: QueueMessage):
+        await asyncio.to_thread(self.poison_queue_client.send_message, message.content)
+        await asyncio.to_thread(self.queue_client.delete_message, message.id, message.pop_receipt)
+        logger.error(f"Moved message {message.id} to {self.poison_queue_name} after {message.dequeue_count} attempts")
+
+    async def _handle_message(self, message: QueueMessage):
+        case_id = None
+        try:
+            message_content = json.loads(message.content)
+            case_id = message_content["case_id"]
+            filename = message_content["filename"]
+            blob_url = message_content["blob_url"]
+            restart = bool(message_content.get("restart", False))
+        except (ValueError, KeyError) as e:
+            logger.error(f"Invalid queue message {message.id}: {str(e)}")
+            await self._dead_letter(message)
+            return
+
+        if message.dequeue_count > self.max_dequeue_count:
+            await self._dead_letter(message)
+            await asyncio.to_thread(self.cosmos_db.update_case_status, case_id, "error")
+            return
+
+        lease = {"pop_receipt": message.pop_receipt}
+        stop_renewal = asyncio.Event()
+        renewal = asyncio.create_task(self._renew_visibility(message, lease, stop_renewal))
+        try:
+            with self.cosmos_db.request_scope():
+                await asyncio.to_thread(self.cosmos_db.update_case_status, case_id, "processing")
+                
+                logger.info(f"Processing audio file: {filename} for case: {case_id} (attempt {message.dequeue_count})")
+                await self.process_audio_file(case_id, filename, blob_url, restart and message.dequeue_count == 1)
+                
+                await asyncio.to_thread(self.cosmos_db.update_case_status, case_id, "completed")
+            
+            stop_renewal.set()
+            await renewal
+            await asyncio.to_thread(self.queue_client.delete_message, message.id, lease["pop_receipt"])
+            logger.info(f"Processed audio file: {filename} for case: {case_id}")
+        except Exception as e:
+            logger.error(f"Error processing message {message.id}: {str(e)}")
+        finally:
+            stop_renewal.set()
+            if not renewal.done():
+                renewal.cancel()
+
+    async def process_queue(self, concurrency: Optional[int] = None):
+        concurrency = concurrency or self.queue_concurrency
+        logger.info(f"Processing queue with concurrency {concurrency}")
         self.is_processing = True
+        await self._recover_ingestion_batches()
+        in_flight = set()
+        idle_delay = self.min_poll_interval
+
         while self.is_processing:
-            messages = self.queue_client.receive_messages(messages_per_page=1)
-            for message in messages:
-                try:
-                    message_content = json.loads(message.content)
-                    case_id = message_content["case_id"]
-                    filename = message_content["filename"]
-                    blob_url = message_content["blob_url"]
-                    
-                    self.cosmos_db.update_case_status(case_id, "processing")
-                    
-                    logger.info(f"Processing audio file: {filename} for case: {case_id}")
-                    await self.process_audio_file(case_id, filename, blob_url)
-                    
-                    self.cosmos_db.update_case_status(case_id, "completed")
-                    
-                    self.queue_client.delete_message(message)
-                    logger.info(f"Processed audio file: {filename} for case: {case_id}")
-                except Exception as e:
-                    logger.error(f"Error processing message: {str(e)}")
-                    self.cosmos_db.update_case_status(case_id, "error")
-            await asyncio.sleep(10)
+            capacity = concurrency - len(in_flight)
+            if capacity <= 0:
+                await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                continue
+
+            try:
+                messages = await asyncio.to_thread(self._receive_batch, min(capacity, self.batch_size))
+            except Exception as e:
+                logger.error(f"Error receiving messages: {str(e)}")
+                messages = []
+
+            if messages:
+                idle_delay = self.min_poll_interval
+                for message in messages:
+                    task = asyncio.create_task(self._handle_message(message))
+                    in_flight.add(task)
+                    task.add_done_callback(in_flight.discard)
+                continue
+
+            if in_flight:
+                await asyncio.wait(in_flight, timeout=idle_delay, return_when=asyncio.FIRST_COMPLETED)
+            else:
+                await asyncio.sleep(idle_delay)
+            idle_delay = min(idle_delay * 2, self.max_poll_interval)
+
+        if in_flight:
+            logger.info(f"Waiting for {len(in_flight)} in-flight jobs to finish")
+            await asyncio.gather(*in_flight, return_exceptions=True)
+        await self.ingestion_scheduler.drain(self.ingestion_drain_seconds)
+        await self.segment_store.close()
 
     def stop_processing(self):
         self.is_processing = False
@@ -0,0 +1,46 @@
+import json
+import logging
+from typing import Any
+from azure.core.exceptions import ResourceExistsError, ResourceNotFoundError
+from azure.storage.blob import BlobServiceClient, ContentSettings
+
+logger = logging.getLogger(__name__)
+
+
+class CheckpointStore:
+    def __init__(self, blob_service_client: BlobServiceClient, container_name: str):
+        self.container_client = blob_service_client.get_container_client(container_name)
+        self.container_ready = False
+
+    def _ensure_container(self):
+        if self.container_ready:
+            return
+        try:
+            self.container_client.create_container()
+        except ResourceExistsError:
+            pass
+        self.container_ready = True
+
+    @staticmethod
+    def _prefix(case_id: str, filename: str) -> str:
+        return f"{case_id}/{filename}/"
+
+    def save(self, case_id: str, filename: str, stage: str, output: Any) -> None:
+        self._ensure_container()
+        self.container_client.upload_blob(
+            f"{self._prefix(case_id, filename)}{stage}.json",
+            json.dumps({"output": output}),
+            overwrite=True,
+            content_settings=ContentSettings(content_type="application/json")
+        )
+
+    def load(self, case_id: str, filename: str, stage: str) -> Any:
+        blob_client = self.container_client.get_blob_client(f"{self._prefix(case_id, filename)}{stage}.json")
+        return json.loads(blob_client.download_blob().readall())["output"]
+
+    def delete(self, case_id: str, filename: str) -> None:
+        try:
+            for blob in self.container_client.list_blobs(name_starts_with=self._prefix(case_id, filename)):
+                self.container_client.delete_blob(blob.name)
+        except ResourceNotFoundError:
+            pass
@@ -1,27 +1,44 @@
 import os
 import json
+import asyncio
 import logging
-from typing import List, Dict, Any
-from openai import AzureOpenAI
+from typing import List, Dict, Any, Optional
 from dotenv import load_dotenv
+from integration.artifact_cache import ArtifactCache, get_artifact_cache
+from integration.openai_pool import estimate_tokens, get_openai_pool
+from integration.knowledge_graph import KnowledgeGraph, merge_graphs
+from ingestion.srt import SegmentTable, format_clock
 
 load_dotenv()
 
+GRAPH_PROMPT_VERSION = "4"
+GRAPH_MAX_TOKENS = 4000
+GRAPH_API_VERSION = "2023-05-15"
+
 class GraphGenerator:
     def __init__(self):
-        self.client = AzureOpenAI(
-            azure_endpoint = os.getenv("OPENAI_API_BASE"),
-            api_key=os.getenv("AOAI_API_KEY"),
-            api_version="2023-05-15"
-        )
+        self.openai_pool = get_openai_pool()
         self.deployment_name = os.getenv("GPT_MODEL_DEPLOYMENT_NAME")
         self.logger = logging.getLogger(__name__)
-
-    async def generate_graph(self, transcription: List[Dict[str, Any]], case_id: str) -> Dict[str, Any]:
+        self.cache = get_artifact_cache()
+        self.mode = os.getenv("GRAPH_GENERATION_MODE", "mapreduce").lower()
+        self.concurrency = int(os.getenv("GRAPH_CONCURRENCY", "4"))
+        self.window_ms = int(os.getenv("GRAPH_WINDOW_SECONDS", "600")) * 1000
+
+    async def generate_graph(self, segments: SegmentTable, case_id: str,
+                             context_graph: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        windows = segments.windows(self.window_ms)
+        if self.mode == "sequential":
+            graph = await self._generate_sequential(windows, case_id)
+        else:
+            graph = await self._generate_map_reduce(windows, case_id)
+        # Known entities keep the ids they already have in the case
+        return KnowledgeGraph.from_dict(context_graph).canonicalize(graph)
+
+    async def _generate_sequential(self, windows: List[SegmentTable], case_id: str) -> Dict[str, Any]:
         full_graph = {"nodes": [], "relationships": [], "timecodes": {}}
-        chunk_size = 20 * 60  # 20 minutes in seconds
 
-        for chunk in transcription:
+        for chunk in windows:
             try:
                 updated_graph = await self._process_chunk(chunk, full_graph)
                 full_graph = self._merge_graphs(full_graph, updated_graph)
@@ -31,19 +48,37 @@ class GraphGenerator:
 
         return full_graph
 
-    async def _process_chunk(self, chunk: Dict[str, Any], current_graph: Dict[str, Any]) -> Dict[str, Any]:
-        prompt = self._create_prompt(chunk, current_graph)
-        response = await self._get_completion(prompt)
+    async def _generate_map_reduce(self, windows: List[SegmentTable], case_id: str) -> Dict[str, Any]:
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def extract(chunk: SegmentTable) -> Dict[str, Any]:
+            async with semaphore:
+                prompt = self._create_prompt(chunk, "")
+                response = await self._get_completion(prompt, chunk)
+                return self._parse_response(response, chunk)
+
+        results = await asyncio.gather(*(extract(chunk) for chunk in windows), return_exceptions=True)
+
+        full_graph = KnowledgeGraph()
+        for result in results:
+            if isinstance(result, Exception):
+                self.logger.error(f"Error processing chunk for case {case_id}: {str(result)}")
+                continue
+            full_graph.merge(result)
+
+        return full_graph.to_dict()
+
+    async def _process_chunk(self, chunk: SegmentTable, current_graph: Dict[str, Any]) -> Dict[str, Any]:
+        prompt = self._create_prompt(chunk, f"The current knowledge graph is:\n{json.dumps(current_graph, indent=2)}")
+        response = await self._get_completion(prompt, chunk)
         return self._parse_response(response, chunk)
 
-    def _create_prompt(self, chunk: Dict[str, Any], current_graph: Dict[str, Any]) -> str:
+    def _create_prompt(self, chunk: SegmentTable, context: str) -> str:
         chunk_text = self._format_chunk(chunk)
-        graph_json = json.dumps(current_graph, indent=2)
 
         prompt = f"""
         You are an AI assistant tasked with generating a knowledge graph from audio transcription data.
-        The current knowledge graph is:
-        {graph_json}
+        {context}
 
         Please analyze the following chunk of transcription and update the knowledge graph:
         {chunk_text}
@@ -59,6 +94,7 @@ class GraphGenerator:
         4. Maintain entity consistency across references.
         5. Only include information explicitly mentioned in the text.
         6. Include timecodes for each node, representing when the entity or statement is first mentioned.
+           Use the [HH:MM:SS] marker of the line where it is mentioned.
 
         Your response should be in this format:
         {{
@@ -80,24 +116,28 @@ class GraphGenerator:
         """
         return prompt
 
-    def _format_chunk(self, chunk: Dict[str, Any]) -> str:
-        formatted_chunk = ""
-        lines = chunk['transcription'].split('\n')
-        for line in lines:
-            if '-->' not in line:
-                formatted_chunk += f"{line}\n"
-        return formatted_chunk
+    def _format_chunk(self, chunk: SegmentTable) -> str:
+        return "".join(f"[{format_clock(segment.start_ms)}] {segment.text}\n" for segment in chunk)
+
+    async def _get_completion(self, prompt: str, chunk: SegmentTable) -> str:
+        # Keyed on the window only: in sequential mode a hit may have seen an older graph
+        cache_key = ArtifactCache.key("graph", GRAPH_PROMPT_VERSION, self.deployment_name, self.mode,
+                                      ArtifactCache.content_hash(self._format_chunk(chunk)))
+        return await self.cache.get_or_create("graph", cache_key, lambda: self._request_completion(prompt))
 
-    async def _get_completion(self, prompt: str) -> str:
+    async def _request_completion(self, prompt: str) -> str:
         try:
-            response = self.client.chat.completions.create(
-                model=self.deployment_name,
-                messages=[
-                    {"role": "system", "content": "You are a helpful assistant that generates knowledge graphs from transcription data."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0,
-                max_tokens=4000
+            messages = [
+                {"role": "system", "content": "You are a helpful assistant that generates knowledge graphs from transcription data."},
+                {"role": "user", "content": prompt}
+            ]
+            response = await self.openai_pool.run(
+                self.deployment_name,
+                lambda client: client.chat.completions.create(
+                    model=self.deployment_name, messages=messages, temperature=0, max_tokens=GRAPH_MAX_TOKENS
+                ),
+                estimated_tokens=estimate_tokens(prompt) + GRAPH_MAX_TOKENS,
+                api_version=GRAPH_API_VERSION
             )
             json_output = response.choices[0].message.content
             return json_output.replace('```json', '').replace('```', '')
@@ -105,7 +145,7 @@ class GraphGenerator:
             self.logger.error(f"Error getting completion from OpenAI: {str(e)}")
             raise
 
-    def _parse_response(self, response: str, chunk: Dict[str, Any]) -> Dict[str, Any]:
+    def _parse_response(self, response: str, chunk: SegmentTable) -> Dict[str, Any]:
         try:
             graph_data = json.loads(response)
             graph_data['timecodes'] = self._convert_timecodes(chunk, graph_data.get('timecodes', {}))
@@ -114,9 +154,9 @@ class GraphGenerator:
             self.logger.error(f"Error parsing JSON response: {response}")
             return {"nodes": [], "relationships": [], "timecodes": {}}
 
-    def _convert_timecodes(self, chunk: Dict[str, Any], timecodes: Dict[str, List[str]]) -> Dict[str, List[str]]:
+    def _convert_timecodes(self, chunk: SegmentTable, timecodes: Dict[str, List[str]]) -> Dict[str, List[str]]:
         converted_timecodes = {}
-        filename = chunk.get('filename', 'unknown')
+        filename = chunk.file_id or 'unknown'
 
         for entity, times in timecodes.items():
             converted_timecodes[entity] = []
@@ -130,37 +170,13 @@ class GraphGenerator:
 
     def _time_to_seconds(self, time: str) -> int:
         try:
-            h, m, s = map(float, time.replace(',', '.').split(':'))
-            return int(h * 3600 + m * 60 + s)
+            seconds = 0.0
+            for part in time.replace(',', '.').split(':'):
+                seconds = seconds * 60 + float(part)
+            return int(seconds)
         except ValueError:
             self.logger.warning(f"Invalid time format: {time}")
             return 0
 
     def _merge_graphs(self, graph1: Dict[str, Any], graph2: Dict[str, Any]) -> Dict[str, Any]:
-        merged_graph = {
-            "nodes": graph1.get("nodes", []) + graph2.get("nodes", []),
-            "relationships": graph1.get("relationships", []) + graph2.get("relationships", []),
-            "timecodes": {**graph1.get("timecodes", {}), **graph2.get("timecodes", {})}
-        }
-
-        unique_nodes = {node["id"]: node for node in merged_graph["nodes"]}
-        unique_relationships = set()
-        unique_rel_list = []
-
-        for rel in merged_graph["relationships"]:
-            if isinstance(rel, dict) and all(key in rel for key in ["source", "target", "type"]):
-                rel_tuple = (rel["source"], rel["target"], rel["type"])
-                if rel_tuple not in unique_relationships:
-                    unique_relationships.add(rel_tuple)
-                    unique_rel_list.append(rel)
-            else:
-                self.logger.warning(f"Skipping invalid relationship: {rel}")
-
-        for entity in merged_graph["timecodes"]:
-            merged_graph["timecodes"][entity] = list(set(merged_graph["timecodes"][entity]))
-
-        return {
-            "nodes": list(unique_nodes.values()),
-            "relationships": unique_rel_list,
-            "timecodes": merged_graph["timecodes"]
-        }
\ No newline at end of file
+        return merge_graphs([graph1, graph2])
@@ -0,0 +1,137 @@
+import os
+import time
+import asyncio
+import logging
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_JOB_STATUSES = {"succeeded", "failed", "cancelled", "canceled"}
+
+
+class CaseBatch:
+    def __init__(self):
+        self.pending: Dict[str, None] = {}
+        self.first_added = 0.0
+        self.last_added = 0.0
+        self.wake = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+
+# Coalesces the files of a case into one search ingestion job per quiet period
+class IngestionJobScheduler:
+    def __init__(self, ingestion_job_api: Any, on_batch_done: Callable[[str, List[str], Dict[str, Any]], None]):
+        self.ingestion_job_api = ingestion_job_api
+        self.on_batch_done = on_batch_done
+        self.quiet_seconds = float(os.getenv("INGESTION_JOB_QUIET_SECONDS", "30"))
+        self.max_batch = max(int(os.getenv("INGESTION_JOB_MAX_BATCH", "20")), 1)
+        self.max_delay_seconds = float(os.getenv("INGESTION_JOB_MAX_DELAY_SECONDS", "300"))
+        self.poll_seconds = float(os.getenv("INGESTION_JOB_POLL_SECONDS", "15"))
+        self.job_timeout_seconds = float(os.getenv("INGESTION_JOB_TIMEOUT_SECONDS", "3600"))
+        self.max_attempts = int(os.getenv("INGESTION_JOB_MAX_ATTEMPTS", "3"))
+        self.batches: Dict[str, CaseBatch] = {}
+        self.draining = False
+        self.stats = {"files": 0, "jobs": 0, "failed_jobs": 0}
+
+    def schedule(self, case_id: str, filename: str) -> Dict[str, Any]:
+        # Must be called from the event loop that runs the queue consumer
+        batch = self.batches.get(case_id)
+        if batch is None:
+            batch = self.batches[case_id] = CaseBatch()
+        now = time.monotonic()
+        if not batch.pending:
+            batch.first_added = now
+        batch.last_added = now
+        batch.pending[filename] = None
+        self.stats["files"] += 1
+        batch.wake.set()
+        if batch.task is None or batch.task.done():
+            batch.task = asyncio.create_task(self._run_case(case_id, batch))
+        return {"status": "scheduled", "job_id": f"{case_id}-ingestion", "pending": len(batch.pending)}
+
+    async def _wait_quiet(self, batch: CaseBatch):
+        while not self.draining and len(batch.pending) < self.max_batch:
+            now = time.monotonic()
+            deadline = min(batch.last_added + self.quiet_seconds, batch.first_added + self.max_delay_seconds)
+            if now >= deadline:
+                return
+            batch.wake.clear()
+            try:
+                await asyncio.wait_for(batch.wake.wait(), deadline - now)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _wait_for_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        started = time.monotonic()
+        while True:
+            try:
+                job = await asyncio.to_thread(self.ingestion_job_api.get_ingestion_job, job_id)
+            except Exception as e:
+                logger.warning(f"Could not read status of ingestion job {job_id}: {str(e)}")
+                job = {"status": "unknown"}
+            if job is None or job.get("status", "").lower() in TERMINAL_JOB_STATUSES:
+                return job
+            if time.monotonic() - started > self.job_timeout_seconds:
+                logger.warning(f"Ingestion job {job_id} still {job.get('status')} after {self.job_timeout_seconds:.0f}s")
+                return job
+            await asyncio.sleep(self.poll_seconds)
+
+    async def _run_case(self, case_id: str, batch: CaseBatch):
+        job_id = f"{case_id}-ingestion"
+        attempt = 0
+        while batch.pending:
+            await self._wait_quiet(batch)
+            # The job may have been started by another worker process as well
+            await self._wait_for_job(job_id)
+
+            filenames = list(batch.pending)
+            started = time.monotonic()
+            try:
+                job_result = await asyncio.to_thread(self.ingestion_job_api.create_ingestion_job, job_id)
+            except Exception as e:
+                job_result = {"status": "error", "message": str(e)}
+            if job_result["status"] == "error":
+                attempt += 1
+                self.stats["failed_jobs"] += 1
+                logger.error(f"Ingestion job for case {case_id} failed to start (attempt {attempt}): {job_result['message']}")
+                if attempt < self.max_attempts:
+                    batch.first_added = batch.last_added = time.monotonic()
+                    await asyncio.sleep(self.poll_seconds)
+                    continue
+
+            # Files scheduled again meanwhile stay for the next job
+            for filename in filenames:
+                batch.pending.pop(filename, None)
+            if job_result["status"] == "error":
+                job = {"status": "error", "message": job_result["message"]}
+            else:
+                attempt = 0
+                self.stats["jobs"] += 1
+                logger.info(f"Started ingestion job {job_id} for {len(filenames)} files")
+                job = {"status": "initiated"} if self.draining else await self._wait_for_job(job_id)
+
+            result = {
+                "job_id": job_id,
+                "status": (job or {}).get("status", "unknown"),
+                "batch_size": len(filenames),
+                "duration_ms": int((time.monotonic() - started) * 1000)
+            }
+            try:
+                await asyncio.to_thread(self.on_batch_done, case_id, filenames, result)
+            except Exception as e:
+                logger.warning(f"Could not record ingestion job result for case {case_id}: {str(e)}")
+
+    async def drain(self, timeout: float):
+        self.draining = True
+        tasks = [batch.task for batch in self.batches.values() if batch.task is not None and not batch.task.done()]
+        for batch in self.batches.values():
+            batch.wake.set()
+        if not tasks:
+            return
+        _, still_running = await asyncio.wait(tasks, timeout=timeout)
+        for case_id, batch in self.batches.items():
+            if batch.task in still_running and batch.pending:
+                logger.warning(f"Ingestion job for case {case_id} not started for: {', '.join(batch.pending)}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return dict(self.stats, pending={case_id: len(batch.pending) for case_id, batch in self.batches.items() if batch.pending})
@@ -0,0 +1,241 @@
+import hashlib
+import logging
+import io
+from dataclasses import dataclass, field
+from typing import BinaryIO, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+READ_BLOCK_SIZE = 64 * 1024
+MAX_CHUNK_BYTES = 24 * 1024 * 1024
+DEFAULT_CHUNK_DURATION_MS = 10 * 60 * 1000
+
+# Bitrates in kbps indexed by [version is MPEG1][layer][bitrate index]
+BITRATES = {
+    True: {
+        1: (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+        2: (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+        3: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    },
+    False: {
+        1: (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+        2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+        3: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    },
+}
+
+SAMPLE_RATES = {
+    3: (44100, 48000, 32000),  # MPEG1
+    2: (22050, 24000, 16000),  # MPEG2
+    0: (11025, 12000, 8000),   # MPEG2.5
+}
+
+
+class ChunkBufferPool:
+    def __init__(self):
+        self._free: List[bytearray] = []
+
+    def acquire(self) -> bytearray:
+        try:
+            return self._free.pop()
+        except IndexError:
+            return bytearray()
+
+    def release(self, buffer: bytearray):
+        self._free.append(buffer)
+
+
+@dataclass
+class AudioChunk:
+    index: int
+    start_ms: int
+    duration_ms: int
+    buffer: bytearray = field(repr=False)
+    size: int
+    pool: Optional[ChunkBufferPool] = field(default=None, repr=False)
+
+    @property
+    def data(self) -> memoryview:
+        return memoryview(self.buffer)[:self.size]
+
+    def release(self):
+        if self.pool is not None:
+            self.pool.release(self.buffer)
+            self.pool = None
+
+
+class MemoryviewReader(io.RawIOBase):
+    def __init__(self, view: memoryview, name: str):
+        super().__init__()
+        self._view = view
+        self._position = 0
+        self.name = name
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, target) -> int:
+        count = min(len(target), len(self._view) - self._position)
+        target[:count] = self._view[self._position:self._position + count]
+        self._position += count
+        return count
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            self._position = offset
+        elif whence == io.SEEK_CUR:
+            self._position += offset
+        else:
+            self._position = len(self._view) + offset
+        self._position = max(0, min(self._position, len(self._view)))
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+    def close(self):
+        if not self.closed:
+            self._view.release()
+        super().close()
+
+
+def parse_frame_header(header: bytes) -> Optional[Tuple[int, int, int]]:
+    if len(header) < 4 or header[0] != 0xFF or (header[1] & 0xE0) != 0xE0:
+        return None
+
+    version_bits = (header[1] >> 3) & 0x03
+    layer_bits = (header[1] >> 1) & 0x03
+    bitrate_index = (header[2] >> 4) & 0x0F
+    sample_rate_index = (header[2] >> 2) & 0x03
+    padding = (header[2] >> 1) & 0x01
+
+    if version_bits == 1 or layer_bits == 0 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+
+    layer = 4 - layer_bits
+    is_mpeg1 = version_bits == 3
+    bitrate = BITRATES[is_mpeg1][layer][bitrate_index] * 1000
+    sample_rate = SAMPLE_RATES[version_bits][sample_rate_index]
+
+    if layer == 1:
+        return (12 * bitrate // sample_rate + padding) * 4, 384, sample_rate
+    if layer == 3 and not is_mpeg1:
+        return 72 * bitrate // sample_rate + padding, 576, sample_rate
+    return 144 * bitrate // sample_rate + padding, 1152, sample_rate
+
+
+def _id3v2_size(header: bytes) -> int:
+    size = 0
+    for byte in header[6:10]:
+        size = (size << 7) | (byte & 0x7F)
+    footer = 10 if header[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def _is_info_frame(frame: memoryview) -> bool:
+    head = bytes(frame[:64])
+    return b"Xing" in head or b"Info" in head or head[36:40] == b"VBRI"
+
+
+# Splits at frame boundaries without decoding
+class Mp3Chunker:
+    def __init__(self, max_duration_ms: int = DEFAULT_CHUNK_DURATION_MS, max_bytes: int = MAX_CHUNK_BYTES,
+                 buffer_pool: Optional[ChunkBufferPool] = None):
+        self.max_duration_ms = max_duration_ms
+        self.max_bytes = max_bytes
+        self.buffer_pool = buffer_pool or ChunkBufferPool()
+        self.audio_hash = hashlib.sha256()
+
+    def _frames(self, stream: BinaryIO) -> Iterator[Tuple[memoryview, int, int]]:
+        buffer = bytearray()
+        position = 0
+        eof = False
+        skip = 0
+        first_frame = True
+
+        while True:
+            if len(buffer) - position < 10 and not eof:
+                if position:
+                    del buffer[:position]
+                    position = 0
+                block = stream.read(READ_BLOCK_SIZE)
+                if not block:
+                    eof = True
+                else:
+                    self.audio_hash.update(block)
+                    buffer += block
+                continue
+
+            if skip:
+                consumed = min(skip, len(buffer) - position)
+                position += consumed
+                skip -= consumed
+                if skip and eof:
+                    return
+                continue
+
+            if len(buffer) - position < 4:
+                return
+
+            header = bytes(buffer[position:position + 10])
+            if header[:3] == b"ID3" and len(header) == 10:
+                skip = _id3v2_size(header)
+                continue
+
+            frame_info = parse_frame_header(header)
+            if frame_info is None:
+                position += 1
+                continue
+
+            frame_length, samples, sample_rate = frame_info
+            while len(buffer) - position < frame_length and not eof:
+                block = stream.read(READ_BLOCK_SIZE)
+                if not block:
+                    eof = True
+                    break
+                self.audio_hash.update(block)
+                buffer += block
+
+            if len(buffer) - position < frame_length:
+                return
+
+            frame = memoryview(buffer)[position:position + frame_length]
+            position += frame_length
+            if first_frame:
+                first_frame = False
+                if _is_info_frame(frame):
+                    frame.release()
+                    continue
+            yield frame, samples, sample_rate
+            frame.release()
+
+    def chunks(self, stream: BinaryIO) -> Iterator[AudioChunk]:
+        index = 0
+        elapsed_samples_ms = 0.0
+        chunk_start_ms = 0.0
+        current = self.buffer_pool.acquire()
+        size = 0
+
+        for frame, samples, sample_rate in self._frames(stream):
+            chunk_duration_ms = elapsed_samples_ms - chunk_start_ms
+            if size and (chunk_duration_ms >= self.max_duration_ms or size + len(frame) > self.max_bytes):
+                yield AudioChunk(index, int(chunk_start_ms), int(chunk_duration_ms), current, size, self.buffer_pool)
+                index += 1
+                chunk_start_ms = elapsed_samples_ms
+                current = self.buffer_pool.acquire()
+                size = 0
+
+            current[size:size + len(frame)] = frame
+            size += len(frame)
+            elapsed_samples_ms += samples * 1000 / sample_rate
+
+        if size:
+            yield AudioChunk(index, int(chunk_start_ms), int(elapsed_samples_ms - chunk_start_ms), current, size, self.buffer_pool)
+            index += 1
+        else:
+            self.buffer_pool.release(current)
+
+        logger.debug(f"Split MP3 stream into {index} chunks")
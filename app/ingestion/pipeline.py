@@ -0,0 +1,108 @@
+import time
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+StageResults = Dict[str, Any]
+StageUpdateCallback = Callable[[str, Dict[str, Any]], None]
+
+
+@dataclass
+class Stage:
+    name: str
+    run: Callable[[StageResults], Awaitable[Any]]
+    depends_on: List[str] = field(default_factory=list)
+
+
+class StageFailedError(Exception):
+    def __init__(self, stage: str, error: BaseException):
+        super().__init__(f"Stage '{stage}' failed: {str(error)}")
+        self.stage = stage
+        self.error = error
+
+
+# Runs a DAG of async stages; a failed stage skips everything downstream of it
+class PipelineExecutor:
+    def __init__(self, stages: List[Stage], on_stage_update: Optional[StageUpdateCallback] = None):
+        self.stages = {stage.name: stage for stage in stages}
+        self.on_stage_update = on_stage_update
+        self.records: Dict[str, Dict[str, Any]] = {}
+        self._validate()
+
+    def _validate(self):
+        for stage in self.stages.values():
+            for dependency in stage.depends_on:
+                if dependency not in self.stages:
+                    raise ValueError(f"Stage '{stage.name}' depends on unknown stage '{dependency}'")
+
+        visiting, visited = set(), set()
+
+        def visit(name: str):
+            if name in visited:
+                return
+            if name in visiting:
+                raise ValueError(f"Pipeline has a dependency cycle through '{name}'")
+            visiting.add(name)
+            for dependency in self.stages[name].depends_on:
+                visit(dependency)
+            visiting.discard(name)
+            visited.add(name)
+
+        for name in self.stages:
+            visit(name)
+
+    async def _record(self, name: str, **values: Any):
+        record = self.records.setdefault(name, {})
+        record.update(values)
+        if self.on_stage_update:
+            try:
+                await asyncio.to_thread(self.on_stage_update, name, dict(record))
+            except Exception as e:
+                logger.warning(f"Could not record status of stage {name}: {str(e)}")
+
+    async def run(self, results: Optional[StageResults] = None) -> StageResults:
+        results = results if results is not None else {}
+        loop = asyncio.get_running_loop()
+        done: Dict[str, asyncio.Future] = {name: loop.create_future() for name in self.stages}
+
+        async def run_stage(stage: Stage):
+            try:
+                for dependency in stage.depends_on:
+                    await done[dependency]
+            except Exception:
+                await self._record(stage.name, status="skipped")
+                done[stage.name].set_exception(StageFailedError(stage.name, RuntimeError("dependency failed")))
+                return
+
+            if stage.name in results:
+                await self._record(stage.name, status="completed", cached=True)
+                done[stage.name].set_result(results[stage.name])
+                return
+
+            started = time.time()
+            await self._record(stage.name, status="running", started_at=started)
+            try:
+                result = await stage.run(results)
+            except Exception as e:
+                duration_ms = int((time.time() - started) * 1000)
+                logger.error(f"Stage {stage.name} failed after {duration_ms} ms: {str(e)}")
+                await self._record(stage.name, status="failed", duration_ms=duration_ms, error=str(e))
+                done[stage.name].set_exception(StageFailedError(stage.name, e))
+                return
+
+            results[stage.name] = result
+            duration_ms = int((time.time() - started) * 1000)
+            logger.info(f"Stage {stage.name} completed in {duration_ms} ms")
+            await self._record(stage.name, status="completed", duration_ms=duration_ms)
+            done[stage.name].set_result(result)
+
+        await asyncio.gather(*(run_stage(stage) for stage in self.stages.values()))
+
+        errors = {name: future.exception() for name, future in done.items()}
+        failed = [name for name in self.stages if self.records.get(name, {}).get("status") == "failed"]
+        if failed:
+            raise errors[failed[0]]
+        return results
@@ -0,0 +1,73 @@
+import os
+import asyncio
+import logging
+import threading
+import weakref
+from typing import Any, Dict, List
+from azure.core.exceptions import ResourceExistsError
+from azure.storage.blob.aio import BlobServiceClient as AsyncBlobServiceClient
+from ingestion.srt import SegmentTable
+
+logger = logging.getLogger(__name__)
+
+
+def segment_blob_name(filename: str, start_seconds: int) -> str:
+    # No hour rollover, so names stay unique
+    minutes, seconds = divmod(start_seconds, 60)
+    return f"{filename}__min{minutes:02d}_{seconds:02d}.txt"
+
+
+class SegmentStore:
+    def __init__(self, account_url: str, credential: Any):
+        self.account_url = account_url
+        self.credential = credential
+        self.mode = os.getenv("SEGMENT_STORE_MODE", "cue")
+        self.window_seconds = max(int(os.getenv("SEGMENT_WINDOW_SECONDS", "60")), 1)
+        self.concurrency = int(os.getenv("SEGMENT_UPLOAD_CONCURRENCY", "16"))
+        self.clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncBlobServiceClient]" = weakref.WeakKeyDictionary()
+        self.lock = threading.Lock()
+
+    def _client(self) -> AsyncBlobServiceClient:
+        # aio clients are bound to the loop that created them
+        loop = asyncio.get_running_loop()
+        with self.lock:
+            client = self.clients.get(loop)
+            if client is None:
+                client = AsyncBlobServiceClient(account_url=self.account_url, credential=self.credential)
+                self.clients[loop] = client
+            return client
+
+    async def close(self):
+        with self.lock:
+            client = self.clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.close()
+
+    def build_segments(self, filename: str, table: SegmentTable) -> Dict[str, str]:
+        # Cues landing on the same name share one document
+        segments: Dict[str, List[str]] = {}
+        for segment in table:
+            start_seconds = segment.start_ms // 1000
+            if self.mode == "window":
+                start_seconds -= start_seconds % self.window_seconds
+            name = segment_blob_name(filename, start_seconds)
+            segments.setdefault(name, []).append(f"Time: {segment.time_range}\nText: {segment.text}\n")
+        return {name: "".join(entries) for name, entries in segments.items()}
+
+    async def store(self, container_name: str, filename: str, table: SegmentTable) -> Dict[str, str]:
+        segments = self.build_segments(filename, table)
+        container_client = self._client().get_container_client(container_name)
+        try:
+            await container_client.create_container()
+        except ResourceExistsError:
+            pass
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def upload(name: str, content: str):
+            async with semaphore:
+                await container_client.upload_blob(name, content.encode("utf-8"), overwrite=True)
+
+        await asyncio.gather(*(upload(name, content) for name, content in segments.items()))
+        logger.info(f"Stored {len(segments)} {self.mode} segments for {filename} in {container_name}")
+        return segments
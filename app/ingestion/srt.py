@@ -0,0 +1,156 @@
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+SRT_TIME_RANGE_PATTERN = re.compile(
+    r"^\s*(\d+):(\d{2}):(\d{2})[,.](\d{3})\s*-->\s*(\d+):(\d{2}):(\d{2})[,.](\d{3})"
+)
+
+
+def format_srt_timestamp(milliseconds: int) -> str:
+    hours, remainder = divmod(max(milliseconds, 0), 3600000)
+    minutes, remainder = divmod(remainder, 60000)
+    seconds, millis = divmod(remainder, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d},{millis:03d}"
+
+
+def format_clock(milliseconds: int) -> str:
+    hours, remainder = divmod(max(milliseconds, 0) // 1000, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+
+
+class Segment:
+    __slots__ = ("start_ms", "end_ms", "text")
+
+    def __init__(self, start_ms: int, end_ms: int, text: str):
+        self.start_ms = start_ms
+        self.end_ms = end_ms
+        self.text = text
+
+    @property
+    def time_range(self) -> str:
+        return f"{format_srt_timestamp(self.start_ms)} --> {format_srt_timestamp(self.end_ms)}"
+
+
+# Column store for the cues of one recording, in start order
+class SegmentTable:
+    __slots__ = ("file_id", "start_ms", "end_ms", "text_offsets", "text")
+
+    def __init__(self, file_id: Optional[str] = None, start_ms: Iterable[int] = (), end_ms: Iterable[int] = (),
+                 text_offsets: Iterable[int] = (0,), text: str = ""):
+        self.file_id = file_id
+        self.start_ms = array("q", start_ms)
+        self.end_ms = array("q", end_ms)
+        self.text_offsets = array("q", text_offsets)
+        self.text = text
+
+    @classmethod
+    def from_columns(cls, file_id: Optional[str], start_ms: List[int], end_ms: List[int],
+                     texts: List[str]) -> "SegmentTable":
+        order = sorted(range(len(start_ms)), key=start_ms.__getitem__)
+        texts = [text.replace("\n", " ") for text in texts]
+        offsets = [0]
+        for i in order:
+            offsets.append(offsets[-1] + len(texts[i]) + 1)
+        text = "".join(f"{texts[i]}\n" for i in order)
+        return cls(file_id, (start_ms[i] for i in order), (end_ms[i] for i in order), offsets, text)
+
+    @classmethod
+    def concat(cls, tables: Iterable["SegmentTable"], file_id: Optional[str] = None) -> "SegmentTable":
+        start_ms, end_ms, texts = [], [], []
+        for table in tables:
+            start_ms.extend(table.start_ms)
+            end_ms.extend(table.end_ms)
+            texts.extend(table.texts())
+        return cls.from_columns(file_id, start_ms, end_ms, texts)
+
+    def __len__(self) -> int:
+        return len(self.start_ms)
+
+    def __iter__(self) -> Iterator[Segment]:
+        for i in range(len(self)):
+            yield self.segment(i)
+
+    def text_at(self, index: int) -> str:
+        return self.text[self.text_offsets[index]:self.text_offsets[index + 1] - 1]
+
+    def segment(self, index: int) -> Segment:
+        return Segment(self.start_ms[index], self.end_ms[index], self.text_at(index))
+
+    def texts(self) -> List[str]:
+        return self.text.split("\n")[:-1] if self.text else []
+
+    @property
+    def duration_ms(self) -> int:
+        return max(self.end_ms) if len(self) else 0
+
+    def slice(self, start: int, stop: int) -> "SegmentTable":
+        base = self.text_offsets[start]
+        return SegmentTable(
+            self.file_id,
+            self.start_ms[start:stop],
+            self.end_ms[start:stop],
+            (offset - base for offset in self.text_offsets[start:stop + 1]),
+            self.text[base:self.text_offsets[stop]]
+        )
+
+    def between(self, from_ms: int, to_ms: int) -> "SegmentTable":
+        return self.slice(bisect_left(self.start_ms, from_ms), bisect_right(self.start_ms, to_ms))
+
+    def windows(self, window_ms: int) -> List["SegmentTable"]:
+        windows, start = [], 0
+        while start < len(self):
+            window_end = (self.start_ms[start] // window_ms + 1) * window_ms
+            stop = bisect_left(self.start_ms, window_end, start)
+            windows.append(self.slice(start, stop))
+            start = stop
+        return windows
+
+    def to_srt(self) -> str:
+        return "\n".join(
+            f"{i + 1}\n{segment.time_range}\n{segment.text}\n" for i, segment in enumerate(self)
+        ).strip()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "file_id": self.file_id,
+            "start_ms": self.start_ms.tolist(),
+            "end_ms": self.end_ms.tolist(),
+            "text_offsets": self.text_offsets.tolist(),
+            "text": self.text
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "SegmentTable":
+        return cls(data.get("file_id"), data["start_ms"], data["end_ms"], data["text_offsets"], data["text"])
+
+
+def parse_srt(srt: str, file_id: Optional[str] = None, offset_ms: int = 0) -> SegmentTable:
+    start_ms, end_ms, texts = [], [], []
+    lines = srt.splitlines()
+    i = 0
+    while i < len(lines):
+        match = SRT_TIME_RANGE_PATTERN.match(lines[i])
+        i += 1
+        if not match:
+            continue
+        text_lines = []
+        while i < len(lines) and lines[i].strip():
+            text_lines.append(lines[i].strip())
+            i += 1
+        h1, m1, s1, ms1, h2, m2, s2, ms2 = map(int, match.groups())
+        start_ms.append(((h1 * 60 + m1) * 60 + s1) * 1000 + ms1 + offset_ms)
+        end_ms.append(((h2 * 60 + m2) * 60 + s2) * 1000 + ms2 + offset_ms)
+        texts.append(" ".join(text_lines))
+    return SegmentTable.from_columns(file_id, start_ms, end_ms, texts)
+
+
+def segment_table(transcription: List[Dict[str, Any]], file_id: Optional[str] = None) -> SegmentTable:
+    # Older cached results only carry SRT text
+    return SegmentTable.concat(
+        (SegmentTable.from_dict(chunk["segments"]) if "segments" in chunk else parse_srt(chunk.get("transcription", ""))
+         for chunk in transcription),
+        file_id
+    )
@@ -1,28 +1,104 @@
 import os
-from typing import List, Dict, Any
-from openai import AzureOpenAI
+import asyncio
+import logging
+from typing import List
 from dotenv import load_dotenv
+from ingestion.srt import SegmentTable
+from integration.artifact_cache import ArtifactCache, get_artifact_cache
+from integration.openai_pool import estimate_tokens, get_openai_pool
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT_VERSION = "2"
+
+SECTION_PROMPT = ("Summarize this part of a longer transcript. Keep the people, facts, figures, "
+                  "decisions and open questions it mentions; skip small talk.")
+REDUCE_PROMPT = ("The following are summaries of consecutive parts of one transcript, in order. "
+                 "Combine them into a single summary that keeps the people, facts, decisions and open questions.")
+
+
+def pack_sections(parts: List[str], max_tokens: int) -> List[str]:
+    sections, current, current_tokens = [], [], 0
+    for part in parts:
+        tokens = estimate_tokens(part)
+        if current and current_tokens + tokens > max_tokens:
+            sections.append(" ".join(current))
+            current, current_tokens = [], 0
+        current.append(part)
+        current_tokens += tokens
+    if current:
+        sections.append(" ".join(current))
+    return sections
+
+
 class SummaryGenerator:
     def __init__(self):
-        self.openai_client = AzureOpenAI(
-            api_key=os.getenv("AOAI_API_KEY"),
-            api_version=os.getenv("OPENAI_API_VERSION"),
-            azure_endpoint=os.getenv("OPENAI_API_BASE")
-        )
+        self.openai_pool = get_openai_pool()
+        self.deployment_name = os.getenv("GPT_MODEL_DEPLOYMENT_NAME")
+        self.mode = os.getenv("SUMMARY_MODE", "hierarchical")
+        self.section_tokens = int(os.getenv("SUMMARY_SECTION_TOKENS", "6000"))
+        self.concurrency = int(os.getenv("SUMMARY_CONCURRENCY", "4"))
+        self.cache = get_artifact_cache()
+
+    async def generate_summary(self, segments: SegmentTable) -> str:
+        # Cue texts only: cue numbers and timestamps carry nothing for a summary
+        parts = [text for text in segments.texts() if text]
+        full_text = " ".join(parts)
+        if self.mode != "hierarchical":
+            cache_key = ArtifactCache.key("summary", SUMMARY_PROMPT_VERSION, self.deployment_name, ArtifactCache.content_hash(full_text))
+            return await self.cache.get_or_create("summary", cache_key, lambda: self._summarize(full_text))
 
-    async def generate_summary(self, transcription: List[Dict[str, Any]]) -> str:
-        full_text = " ".join([chunk['transcription'] for chunk in transcription if 'transcription' in chunk])
-        
-        response = self.openai_client.chat.completions.create(
-            model=os.getenv("GPT_MODEL_DEPLOYMENT_NAME"),
-            messages=[
-                {"role": "system", "content": "You are an AI assistant tasked with summarizing audio transcripts."},
-                {"role": "user", "content": f"Please provide a concise summary of the following transcript:\n\n{full_text}"}
-            ],
-            max_tokens=500
+        cache_key = ArtifactCache.key("summary", SUMMARY_PROMPT_VERSION, self.deployment_name,
+                                      self.section_tokens, ArtifactCache.content_hash(full_text))
+        return await self.cache.get_or_create("summary", cache_key, lambda: self._summarize_hierarchical(parts))
+
+    async def _summarize_hierarchical(self, parts: List[str]) -> str:
+        sections = pack_sections(parts, self.section_tokens)
+        if len(sections) <= 1:
+            return await self._summarize(sections[0] if sections else "")
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        summaries = await asyncio.gather(*(
+            self._cached_completion(semaphore, "summary-section", SECTION_PROMPT, section) for section in sections
+        ))
+        level = 1
+        logger.info(f"Summarized {len(sections)} transcript sections")
+
+        while len(summaries) > 1:
+            groups = pack_sections(summaries, self.section_tokens)
+            if len(groups) == len(summaries):
+                groups = [" ".join(summaries[i:i + 2]) for i in range(0, len(summaries), 2)]
+            if len(groups) == 1:
+                return await self._complete(f"{REDUCE_PROMPT} Keep it concise.", groups[0], max_tokens=500)
+            summaries = await asyncio.gather(*(
+                self._cached_completion(semaphore, "summary-reduce", REDUCE_PROMPT, group) for group in groups
+            ))
+            level += 1
+            logger.info(f"Reduced to {len(summaries)} partial summaries at level {level}")
+        return summaries[0]
+
+    async def _cached_completion(self, semaphore: asyncio.Semaphore, stage: str, instruction: str, text: str) -> str:
+        cache_key = ArtifactCache.key(stage, SUMMARY_PROMPT_VERSION, self.deployment_name, ArtifactCache.content_hash(text))
+
+        async def complete() -> str:
+            async with semaphore:
+                return await self._complete(instruction, text, max_tokens=800)
+
+        return await self.cache.get_or_create(stage, cache_key, complete)
+
+    async def _complete(self, instruction: str, text: str, max_tokens: int) -> str:
+        messages = [
+            {"role": "system", "content": "You are an AI assistant tasked with summarizing audio transcripts."},
+            {"role": "user", "content": f"{instruction}\n\n{text}"}
+        ]
+        response = await self.openai_pool.run(
+            self.deployment_name,
+            lambda client: client.chat.completions.create(model=self.deployment_name, messages=messages, max_tokens=max_tokens),
+            estimated_tokens=estimate_tokens(instruction) + estimate_tokens(text) + max_tokens
         )
-        
-        return response.choices[0].message.content.strip()
\ No newline at end of file
+        return response.choices[0].message.content.strip()
+
+    async def _summarize(self, full_text: str) -> str:
+        return await self._complete("Please provide a concise summary of the following transcript:", full_text, max_tokens=500)
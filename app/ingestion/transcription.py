@@ -1,104 +1,122 @@
 import os
-import io
 import asyncio
-from typing import Dict, Any, List
+import contextlib
+from typing import Dict, Any, Awaitable, List, BinaryIO, Optional, Union
 from dotenv import load_dotenv
 import logging
-from pydub import AudioSegment
-import tempfile
-from openai import AzureOpenAI
+from openai import AsyncAzureOpenAI
+from ingestion.mp3_chunker import Mp3Chunker, AudioChunk, MemoryviewReader
+from ingestion.srt import SegmentTable, parse_srt, segment_table
+from integration.artifact_cache import ArtifactCache, get_artifact_cache
+from integration.openai_pool import get_openai_pool
 
 logging.basicConfig(level=logging.WARN)
 logger = logging.getLogger(__name__)
 load_dotenv()
 
-client = AzureOpenAI(
-    api_key=os.getenv("AOAI_API_KEY"),  
-    api_version=os.getenv("OPENAI_API_VERSION"),
-    azure_endpoint=os.getenv("OPENAI_API_BASE") 
-)
+TRANSCRIPTION_MODEL = "whisper"
+
 
 class TranscriptionService:
     def __init__(self):
-        logger.debug(f"Initialized TranscriptionService")
+        self.concurrency = int(os.getenv("TRANSCRIPTION_CONCURRENCY", "4"))
+        self.max_retries = int(os.getenv("TRANSCRIPTION_MAX_RETRIES", "5"))
+        self.chunk_duration_ms = int(os.getenv("TRANSCRIPTION_CHUNK_SECONDS", "600")) * 1000
+        self.cache = get_artifact_cache()
+        self.openai_pool = get_openai_pool()
+        logger.debug(f"Initialized TranscriptionService with concurrency {self.concurrency}")
+
+    async def transcribe_audio_chunk(self, audio_chunk: AudioChunk) -> str:
+        buffer = MemoryviewReader(audio_chunk.data, f"chunk_{audio_chunk.index}.mp3")
+        try:
+            return await self._create_transcription(buffer, audio_chunk.index)
+        except Exception as e:
+            logger.error(f"Error transcribing chunk {audio_chunk.index}: {str(e)}")
+            raise
+        finally:
+            buffer.close()
 
-    async def transcribe_audio_chunk(self, audio_chunk: AudioSegment, chunk_number: int) -> str:
-        with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as temp_file:
-            audio_chunk.export(temp_file.name, format="mp3")
-            
-            with open(temp_file.name, "rb") as audio_file:
-                buffer = io.BytesIO(audio_file.read())
-                buffer.name = f"chunk_{chunk_number}.mp3"
-                try:
-                    result = client.audio.transcriptions.create(
-                        model="whisper",
-                        file=buffer,
-                        response_format="srt"
-                    )
-                    return result
-                except Exception as e:
-                    logger.error(f"Error transcribing chunk {chunk_number}: {str(e)}")
-                    raise
-                finally:
-                    buffer.close()
-        os.unlink(temp_file.name)
+    async def _create_transcription(self, buffer: BinaryIO, chunk_number: int) -> str:
+        def create(client: AsyncAzureOpenAI) -> Awaitable[str]:
+            buffer.seek(0)
+            return client.audio.transcriptions.create(
+                model=TRANSCRIPTION_MODEL,
+                file=buffer,
+                response_format="srt"
+            )
 
-    async def transcribe_audio(self, audio_file_path: str) -> List[Dict[str, Any]]:
+        return await self.openai_pool.run(TRANSCRIPTION_MODEL, create, max_retries=self.max_retries)
+
+    async def _transcribe_with_offset(self, semaphore: asyncio.Semaphore, chunk: AudioChunk) -> Dict[str, Any]:
         try:
-            audio = AudioSegment.from_mp3(audio_file_path)
-            chunk_size = 25 * 1024 * 1024 * 5
-            chunks = []
-            current_chunk = AudioSegment.empty()
+            logger.debug(f"Transcribing chunk {chunk.index + 1}")
+            chunk_key = ArtifactCache.key("transcription-chunk", TRANSCRIPTION_MODEL, ArtifactCache.content_hash(chunk.data))
+            transcription = await self.cache.get_or_create(
+                "transcription-chunk", chunk_key, lambda: self.transcribe_audio_chunk(chunk)
+            )
+            logger.debug(f"Chunk {chunk.index + 1} transcribed")
+        finally:
+            chunk.release()
+            semaphore.release()
+        return {
+            "chunk_number": chunk.index+1,
+            "offset_ms": chunk.start_ms,
+            "duration_ms": chunk.duration_ms,
+            "segments": parse_srt(transcription, offset_ms=chunk.start_ms).to_dict()
+        }
+
+    def _audio_cache_key(self, audio_hash: str) -> str:
+        return ArtifactCache.key("transcription", TRANSCRIPTION_MODEL, self.chunk_duration_ms, audio_hash)
 
-            for i in range(0, len(audio), 1000):
-                second = audio[i:i+1000]
-                if len(current_chunk.raw_data) + len(second.raw_data) > chunk_size:
-                    chunks.append(current_chunk)
-                    current_chunk = AudioSegment.empty()
-                current_chunk += second
+    async def transcribe_audio(self, audio: Union[str, BinaryIO], audio_hash: Optional[str] = None) -> List[Dict[str, Any]]:
+        if audio_hash:
+            cached = await asyncio.to_thread(self.cache.get, "transcription", self._audio_cache_key(audio_hash))
+            if cached is not None:
+                logger.info(f"Using cached transcription for audio {audio_hash}")
+                return cached
 
-            if len(current_chunk) > 0:
-                chunks.append(current_chunk)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        tasks = []
+        try:
+            chunker = Mp3Chunker(max_duration_ms=self.chunk_duration_ms)
+            with (open(audio, "rb") if isinstance(audio, str) else contextlib.nullcontext(audio)) as audio_stream:
+                chunks = chunker.chunks(audio_stream)
+                # A chunk is only read once a slot is free
+                while True:
+                    await semaphore.acquire()
+                    if any(task.done() and not task.cancelled() and task.exception() for task in tasks):
+                        semaphore.release()
+                        break
+                    chunk = await asyncio.to_thread(next, chunks, None)
+                    if chunk is None:
+                        semaphore.release()
+                        break
+                    tasks.append(asyncio.create_task(self._transcribe_with_offset(semaphore, chunk)))
 
-            processed_result = []
-            for i, chunk in enumerate(chunks):
-                print(f"Chunk {i+1} of {len(chunks)} is being transcribed.")
-                transcription = await self.transcribe_audio_chunk(chunk, i)
-                processed_result.append({
-                    "chunk_number": i+1,
-                    "transcription": transcription
-                })
-                print(f"Chunk {i+1} transcription complete.")
+            processed_result = list(await asyncio.gather(*tasks))
+            if processed_result:
+                await asyncio.to_thread(self.cache.put, "transcription", self._audio_cache_key(chunker.audio_hash.hexdigest()), processed_result)
 
-            print("Full processed result:")
-            print(processed_result)  
+            logger.info(f"Transcribed {len(processed_result)} chunks, "
+                        f"{sum(len(chunk['segments']['start_ms']) for chunk in processed_result)} segments")
             return processed_result
         except Exception as e:
+            for task in tasks:
+                task.cancel()
             logger.error(f"Error during transcription: {str(e)}")
             raise
 
-    def get_full_transcript(self, transcription: List[Dict[str, Any]]) -> str:
-        full_transcript = ""
-        for chunk in transcription:
-            if 'transcription' in chunk:
-                full_transcript += chunk['transcription'] + "\n\n"
-        return full_transcript.strip()
+    def get_full_transcript(self, segments: SegmentTable) -> str:
+        return segments.to_srt()
 
 def speech_to_text(audio_file):
     transcription_service = TranscriptionService()
     
-    with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as temp_file:
-        audio_file.save(temp_file.name)
-        file_path = temp_file.name
-    try:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        result = loop.run_until_complete(transcription_service.transcribe_audio(file_path))
-        
-        full_srt = "\n\n".join([chunk['transcription'] for chunk in result])
-        print("Full SRT for speech_to_text function is:")
-        print(full_srt)
-        
-        return full_srt
-    finally:
-        os.unlink(file_path)
\ No newline at end of file
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    result = loop.run_until_complete(transcription_service.transcribe_audio(audio_file.stream))
+    
+    full_srt = segment_table(result).to_srt()
+    logger.debug(f"speech_to_text produced {len(full_srt)} characters of SRT")
+    
+    return full_srt
@@ -0,0 +1,105 @@
+import os
+import time
+import signal
+import asyncio
+import logging
+import argparse
+import multiprocessing
+from typing import List, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(processName)s %(levelname)s %(name)s: %(message)s")
+logger = logging.getLogger(__name__)
+
+RESTART_DELAY_SECONDS = 5
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run audio ingestion queue consumers outside the web app.")
+    parser.add_argument("--processes", type=int, default=int(os.getenv("INGESTION_WORKER_PROCESSES", "1")),
+                        help="number of consumer processes to run")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("QUEUE_CONCURRENCY", "4")),
+                        help="number of jobs each process runs concurrently")
+    return parser.parse_args(argv)
+
+
+async def consume(concurrency: int):
+    from ingestion.audio_processor import AudioFileProcessor
+
+    processor = AudioFileProcessor()
+    loop = asyncio.get_running_loop()
+    stop_requested = False
+
+    def request_stop():
+        nonlocal stop_requested
+        if stop_requested:
+            logger.warning("Second shutdown signal received, exiting without draining")
+            os._exit(1)
+        stop_requested = True
+        logger.info("Shutdown requested, finishing in-flight jobs")
+        processor.stop_processing()
+
+    loop.add_signal_handler(signal.SIGTERM, request_stop)
+
+    await processor.process_queue(concurrency)
+    logger.info("Consumer stopped")
+
+
+def run_consumer(concurrency: int):
+    # The parent forwards Ctrl+C as SIGTERM
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(consume(concurrency))
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    context = multiprocessing.get_context("spawn")
+    # Rate limits are per process
+    quota_share = float(os.getenv("OPENAI_QUOTA_SHARE", "1")) / max(args.processes, 1)
+    os.environ["OPENAI_QUOTA_SHARE"] = str(quota_share)
+    shutting_down = False
+    processes: List[multiprocessing.Process] = []
+
+    def start_process(index: int) -> multiprocessing.Process:
+        process = context.Process(target=run_consumer, args=(args.concurrency,), name=f"ingestion-worker-{index}")
+        process.start()
+        logger.info(f"Started {process.name} (pid {process.pid}) with concurrency {args.concurrency}")
+        return process
+
+    def shutdown(signum, frame):
+        nonlocal shutting_down
+        if shutting_down:
+            for process in processes:
+                if process.is_alive():
+                    process.kill()
+            return
+        shutting_down = True
+        logger.info(f"Received signal {signum}, stopping {len(processes)} consumer processes")
+        for process in processes:
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    processes.extend(start_process(index) for index in range(args.processes))
+
+    while True:
+        for index, process in enumerate(processes):
+            process.join(timeout=1)
+            if process.is_alive() or shutting_down:
+                continue
+            logger.error(f"{process.name} exited with code {process.exitcode}, restarting")
+            time.sleep(RESTART_DELAY_SECONDS)
+            if not shutting_down:
+                processes[index] = start_process(index)
+        if shutting_down and not any(process.is_alive() for process in processes):
+            break
+
+    logger.info("All consumer processes stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, Optional
+from azure.storage.blob import BlobServiceClient
+from azure.core.exceptions import ResourceExistsError, ResourceNotFoundError
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+class CacheBackend(ABC):
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        pass
+
+    @abstractmethod
+    def put(self, key: str, value: bytes) -> None:
+        pass
+
+    @abstractmethod
+    def size(self) -> int:
+        pass
+
+
+class SQLiteCacheBackend(CacheBackend):
+    def __init__(self, path: str, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS artifacts ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS artifacts_last_access ON artifacts (last_access)")
+        # Total size, kept by triggers
+        self.connection.execute("CREATE TABLE IF NOT EXISTS artifacts_size (id INTEGER PRIMARY KEY CHECK (id = 0), total INTEGER NOT NULL)")
+        self.connection.execute("INSERT OR IGNORE INTO artifacts_size (id, total) SELECT 0, COALESCE(SUM(size), 0) FROM artifacts")
+        self.connection.execute(
+            "CREATE TRIGGER IF NOT EXISTS artifacts_insert AFTER INSERT ON artifacts "
+            "BEGIN UPDATE artifacts_size SET total = total + NEW.size WHERE id = 0; END"
+        )
+        self.connection.execute(
+            "CREATE TRIGGER IF NOT EXISTS artifacts_update AFTER UPDATE OF size ON artifacts "
+            "BEGIN UPDATE artifacts_size SET total = total + NEW.size - OLD.size WHERE id = 0; END"
+        )
+        self.connection.execute(
+            "CREATE TRIGGER IF NOT EXISTS artifacts_delete AFTER DELETE ON artifacts "
+            "BEGIN UPDATE artifacts_size SET total = total - OLD.size WHERE id = 0; END"
+        )
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self.lock:
+            row = self.connection.execute("SELECT value FROM artifacts WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self.connection.execute("UPDATE artifacts SET last_access = ? WHERE key = ?", (time.time(), key))
+            return row[0]
+
+    def put(self, key: str, value: bytes) -> None:
+        with self.lock:
+            self.connection.execute(
+                "INSERT INTO artifacts (key, value, size, last_access) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET value = excluded.value, size = excluded.size, last_access = excluded.last_access",
+                (key, value, len(value), time.time())
+            )
+            self._evict()
+
+    def size(self) -> int:
+        with self.lock:
+            return self._total()
+
+    def _total(self) -> int:
+        return self.connection.execute("SELECT total FROM artifacts_size WHERE id = 0").fetchone()[0]
+
+    def _evict(self):
+        total = self._total()
+        if total <= self.max_bytes:
+            return
+        evicted = 0
+        for key, size in self.connection.execute("SELECT key, size FROM artifacts ORDER BY last_access").fetchall():
+            if total <= self.max_bytes:
+                break
+            self.connection.execute("DELETE FROM artifacts WHERE key = ?", (key,))
+            total -= size
+            evicted += 1
+        logger.info(f"Evicted {evicted} artifacts from local cache")
+
+
+class BlobCacheBackend(CacheBackend):
+    def __init__(self, blob_service_client: BlobServiceClient, container_name: str, max_bytes: int,
+                 eviction_interval: float = 300, touch_interval: float = 3600):
+        self.max_bytes = max_bytes
+        self.eviction_interval = eviction_interval
+        self.touch_interval = touch_interval
+        self.last_eviction = 0.0
+        self.container_client = blob_service_client.get_container_client(container_name)
+        try:
+            self.container_client.create_container()
+        except ResourceExistsError:
+            pass
+
+    def get(self, key: str) -> Optional[bytes]:
+        blob_client = self.container_client.get_blob_client(key)
+        try:
+            downloader = blob_client.download_blob()
+            value = downloader.readall()
+        except ResourceNotFoundError:
+            return None
+        # Only a coarse LRU order is needed
+        last_access = float((downloader.properties.metadata or {}).get("last_access", 0))
+        if time.time() - last_access > self.touch_interval:
+            try:
+                blob_client.set_blob_metadata({"last_access": str(time.time())})
+            except ResourceNotFoundError:
+                pass
+        return value
+
+    def put(self, key: str, value: bytes) -> None:
+        self.container_client.upload_blob(key, value, overwrite=True, metadata={"last_access": str(time.time())})
+        if time.time() - self.last_eviction > self.eviction_interval:
+            self._evict()
+
+    def size(self) -> int:
+        return sum(blob.size for blob in self.container_client.list_blobs())
+
+    def _evict(self):
+        self.last_eviction = time.time()
+        blobs = list(self.container_client.list_blobs(include=["metadata"]))
+        total = sum(blob.size for blob in blobs)
+        if total <= self.max_bytes:
+            return
+        blobs.sort(key=lambda blob: float((blob.metadata or {}).get("last_access", 0)))
+        evicted = 0
+        for blob in blobs:
+            if total <= self.max_bytes:
+                break
+            try:
+                self.container_client.delete_blob(blob.name)
+            except ResourceNotFoundError:
+                pass
+            total -= blob.size
+            evicted += 1
+        logger.info(f"Evicted {evicted} artifacts from blob cache")
+
+
+class ArtifactCache:
+    def __init__(self, backend: Optional[CacheBackend]):
+        self.backend = backend
+        self.hits: Dict[str, int] = defaultdict(int)
+        self.misses: Dict[str, int] = defaultdict(int)
+
+    @staticmethod
+    def key(stage: str, *parts: Any) -> str:
+        digest = hashlib.sha256()
+        for part in (stage,) + parts:
+            digest.update(str(part).encode("utf-8"))
+            digest.update(b"\x00")
+        return f"{stage}-{digest.hexdigest()}"
+
+    @staticmethod
+    def content_hash(content: Any) -> str:
+        if isinstance(content, str):
+            content = content.encode("utf-8")
+        return hashlib.sha256(content).hexdigest()
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    def get(self, stage: str, key: str) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            logger.warning(f"Artifact cache read failed for {key}: {str(e)}")
+            value = None
+        if value is None:
+            self.misses[stage] += 1
+            return None
+        self.hits[stage] += 1
+        return json.loads(value)
+
+    def put(self, stage: str, key: str, value: Any) -> None:
+        if not self.enabled:
+            return
+        try:
+            self.backend.put(key, json.dumps(value).encode("utf-8"))
+        except Exception as e:
+            logger.warning(f"Artifact cache write failed for {key}: {str(e)}")
+
+    async def get_or_create(self, stage: str, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        cached = await asyncio.to_thread(self.get, stage, key)
+        if cached is not None:
+            return cached
+        value = await factory()
+        await asyncio.to_thread(self.put, stage, key, value)
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        stages = set(self.hits) | set(self.misses)
+        return {
+            "enabled": self.enabled,
+            "stages": {
+                stage: {
+                    "hits": self.hits[stage],
+                    "misses": self.misses[stage],
+                    "hit_rate": self.hits[stage] / (self.hits[stage] + self.misses[stage])
+                } for stage in sorted(stages)
+            }
+        }
+
+
+def create_backend_from_env() -> Optional[CacheBackend]:
+    backend = os.getenv("ARTIFACT_CACHE_BACKEND", "sqlite").lower()
+    max_bytes = int(os.getenv("ARTIFACT_CACHE_MAX_MB", "1024")) * 1024 * 1024
+
+    if backend == "sqlite":
+        return SQLiteCacheBackend(os.getenv("ARTIFACT_CACHE_PATH", ".cache/artifacts.db"), max_bytes)
+    if backend == "blob":
+        storage_account_name = os.getenv('STORAGE_ACCOUNT_NAME')
+        blob_service_client = BlobServiceClient(
+            account_url=f"https://{storage_account_name}.blob.core.windows.net",
+            credential=os.getenv('STORAGE_ACCOUNT_KEY')
+        )
+        return BlobCacheBackend(blob_service_client, os.getenv("ARTIFACT_CACHE_CONTAINER", "artifact-cache"), max_bytes)
+    return None
+
+
+_artifact_cache: Optional[ArtifactCache] = None
+_artifact_cache_lock = threading.Lock()
+
+
+def get_artifact_cache() -> ArtifactCache:
+    global _artifact_cache
+    with _artifact_cache_lock:
+        if _artifact_cache is None:
+            try:
+                _artifact_cache = ArtifactCache(create_backend_from_env())
+            except Exception as e:
+                logger.error(f"Artifact cache unavailable, continuing without it: {str(e)}")
+                _artifact_cache = ArtifactCache(None)
+        return _artifact_cache
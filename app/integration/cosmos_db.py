@@ -1,11 +1,48 @@
 import os
-from typing import Dict, Any, List, Optional
+import time
+import random
+import hashlib
+import logging
+import threading
+from typing import Dict, Any, Callable, List, Optional
+from azure.core import MatchConditions
 from azure.cosmos import CosmosClient, PartitionKey
 from azure.cosmos.exceptions import CosmosHttpResponseError
 from dotenv import load_dotenv
+from integration.knowledge_graph import KnowledgeGraph
+from integration.read_cache import ReadThroughCache
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# One partition per case: a case header plus a file, graph and job document per recording
+CASE_DOCUMENT = "case"
+FILE_DOCUMENT = "file"
+GRAPH_DOCUMENT = "graph"
+JOB_DOCUMENT = "job"
+
+MAX_PATCH_OPERATIONS = 10
+ETAG_RETRY_ATTEMPTS = 8
+CASE_LIST_SCOPE = ("__cases__",)
+PARTITION_KEY_PATH = "/case_id"
+
+
+_read_cache: Optional[ReadThroughCache] = None
+_read_cache_lock = threading.Lock()
+
+
+def get_read_cache() -> ReadThroughCache:
+    global _read_cache
+    with _read_cache_lock:
+        if _read_cache is None:
+            _read_cache = ReadThroughCache(
+                ttl_seconds=float(os.getenv("COSMOS_CACHE_TTL_SECONDS", "2")),
+                max_entries=int(os.getenv("COSMOS_CACHE_MAX_ENTRIES", "1024"))
+            )
+        return _read_cache
+
+
 class CosmosDB:
     def __init__(self):
         self.endpoint = os.getenv("COSMOS_DB_ENDPOINT")
@@ -15,20 +52,80 @@ class CosmosDB:
 
         self.client = CosmosClient(self.endpoint, self.key)
         self.database = self.client.get_database_client(self.database_name)
-        self.container = self.database.get_container_client(self.container_name)
+        self.container = self.database.create_container_if_not_exists(
+            id=self.container_name,
+            partition_key=PartitionKey(path=PARTITION_KEY_PATH)
+        )
+        self._check_partition_key()
+        # Cases from before the partitioned layout are migrated on first access
+        self.legacy_container_name = os.getenv("COSMOS_DB_LEGACY_CONTAINER")
+        self.legacy_container = (
+            self.database.get_container_client(self.legacy_container_name) if self.legacy_container_name else None
+        )
+        self.read_cache = get_read_cache()
+
+    def request_scope(self):
+        return self.read_cache.request_scope()
+
+    def cache_stats(self) -> Dict[str, Any]:
+        return self.read_cache.get_stats()
+
+    def _cached(self, case_id: Any, name: str, loader: Callable[[], Any], *args: Any) -> Any:
+        return self.read_cache.get_or_load((case_id, name) + args, loader)
+
+    def _invalidate(self, case_id: str, case_list: bool = False) -> None:
+        self.read_cache.invalidate(case_id)
+        if case_list:
+            self.read_cache.invalidate(CASE_LIST_SCOPE)
+
+    def _check_partition_key(self) -> None:
+        paths = (self.container.read().get("partitionKey") or {}).get("paths", [])
+        if paths != [PARTITION_KEY_PATH]:
+            raise ValueError(
+                f"Cosmos container {self.container_name} is partitioned on {paths}, expected [{PARTITION_KEY_PATH}]. "
+                f"Point COSMOS_DB_CONTAINER at a new container and set COSMOS_DB_LEGACY_CONTAINER={self.container_name} "
+                f"to migrate the existing cases."
+            )
+
+    @staticmethod
+    def _item_id(case_id: str, document_type: str, filename: str) -> str:
+        # Cosmos ids can't contain / \ ? #
+        digest = hashlib.sha256(filename.encode("utf-8")).hexdigest()[:32]
+        return f"{case_id}::{document_type}::{digest}"
+
+    @classmethod
+    def _file_item_id(cls, case_id: str, filename: str) -> str:
+        return cls._item_id(case_id, FILE_DOCUMENT, filename)
+
+    @classmethod
+    def _graph_item_id(cls, case_id: str, filename: str) -> str:
+        return cls._item_id(case_id, GRAPH_DOCUMENT, filename)
+
+    @classmethod
+    def _job_item_id(cls, case_id: str, filename: str) -> str:
+        return cls._item_id(case_id, JOB_DOCUMENT, filename)
+
+    def _query(self, case_id: str, query: str, **parameters: Any) -> List[Any]:
+        return list(self.container.query_items(
+            query=query,
+            parameters=[{"name": f"@{name}", "value": value} for name, value in parameters.items()],
+            partition_key=case_id
+        ))
 
     def create_case(self, case_id: str, description: str) -> Dict[str, Any]:
         case_item = {
             "id": case_id,
+            "case_id": case_id,
+            "type": CASE_DOCUMENT,
             "description": description,
             "files": [],
-            "graph": {"nodes": [], "relationships": []},
-            "status": "created",
-            "summaries": {},
-            "full_transcripts": {}
+            "file_count": 0,
+            "index_version": 0,
+            "status": "created"
         }
         try:
             created_item = self.container.create_item(body=case_item)
+            self._invalidate(case_id, case_list=True)
             return created_item
         except CosmosHttpResponseError as e:
             if e.status_code == 409:  # Conflict error code
@@ -36,117 +133,434 @@ class CosmosDB:
             else:
                 raise
 
-    def get_case(self, case_id: str) -> Optional[Dict[str, Any]]:
+    def get_case_header(self, case_id: str) -> Optional[Dict[str, Any]]:
+        return self._cached(case_id, "header", lambda: self._read_case_header(case_id))
+
+    def _read_case_header(self, case_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            return self.container.read_item(item=case_id, partition_key=case_id)
+        except CosmosHttpResponseError as e:
+            if e.status_code != 404:
+                raise
+        return self._migrate_legacy_case(case_id)
+
+    def _read_legacy_case(self, case_id: str) -> Optional[Dict[str, Any]]:
+        if self.legacy_container is None:
+            return None
         try:
-            case = self.container.read_item(item=case_id, partition_key=case_id)
-            case.setdefault('summaries', {})
-            case.setdefault('full_transcripts', {})
-            return case
+            return self.legacy_container.read_item(item=case_id, partition_key=case_id)
         except CosmosHttpResponseError as e:
             if e.status_code == 404:
                 return None
-            else:
+            raise
+
+    def _migrate_legacy_case(self, case_id: str) -> Optional[Dict[str, Any]]:
+        legacy_case = self._read_legacy_case(case_id)
+        if legacy_case is None:
+            return None
+
+        # Header last, so an interrupted migration is simply retried
+        summaries = legacy_case.get("summaries") or {}
+        transcripts = legacy_case.get("full_transcripts") or {}
+        for filename in set(summaries) | set(transcripts):
+            self.add_summary_and_transcript(case_id, filename, summaries.get(filename), transcripts.get(filename))
+        graph = legacy_case.get("graph") or {}
+        if graph.get("nodes") or graph.get("relationships"):
+            self.save_file_graph(case_id, "*", graph)
+
+        files = [file_info if isinstance(file_info, str) else file_info.get("name") for file_info in legacy_case.get("files", [])]
+        header = {
+            "id": case_id,
+            "case_id": case_id,
+            "type": CASE_DOCUMENT,
+            "description": legacy_case.get("description", ""),
+            "files": files,
+            "file_count": len(files),
+            "index_version": 0,
+            "status": legacy_case.get("status", "created")
+        }
+        try:
+            header = self.container.create_item(body=header)
+            logger.info(f"Migrated legacy case {case_id} with {len(files)} files")
+        except CosmosHttpResponseError as e:
+            if e.status_code != 409:  # Another process migrated it first
                 raise
+            header = self.container.read_item(item=case_id, partition_key=case_id)
+        self._invalidate(case_id, case_list=True)
+        return header
 
-    def update_case(self, case_id: str, updates: Dict[str, Any]) -> Dict[str, Any]:
+    def migrate_legacy_cases(self) -> int:
+        migrated = 0
+        for case_id in self._legacy_case_ids():
+            try:
+                self.container.read_item(item=case_id, partition_key=case_id)
+                continue
+            except CosmosHttpResponseError as e:
+                if e.status_code != 404:
+                    raise
+            if self._migrate_legacy_case(case_id):
+                migrated += 1
+        return migrated
+
+    def _legacy_case_ids(self) -> List[str]:
+        if self.legacy_container is None:
+            return []
+        return list(self.legacy_container.query_items(
+            query="SELECT VALUE c.id FROM c WHERE NOT IS_DEFINED(c.type)",
+            enable_cross_partition_query=True
+        ))
+
+    def get_case(self, case_id: str) -> Optional[Dict[str, Any]]:
+        case = self.get_case_header(case_id)
+        if not case:
+            return None
+
+        files = self._cached(case_id, "files", lambda: self._query(
+            case_id,
+            "SELECT c.filename, c.summary, c.full_transcript FROM c WHERE c.type = @type",
+            type=FILE_DOCUMENT
+        ))
+        registered = set(case.get('files', []))
+        files = [item for item in files if item['filename'] in registered]
+        case['summaries'] = {item['filename']: item.get('summary') for item in files}
+        case['full_transcripts'] = {item['filename']: item.get('full_transcript') for item in files}
+        case['graph'] = self.get_graph(case_id)
+        return case
+
+    def _header_fields(self, case_id: str, name: str, fields: str) -> Optional[Dict[str, Any]]:
+        def load() -> List[Dict[str, Any]]:
+            return self._query(case_id, f"SELECT {fields} FROM c WHERE c.id = @id", id=case_id)
+
+        items = self._cached(case_id, name, load)
+        if not items and self._migrate_legacy_case(case_id):
+            items = self._cached(case_id, name, load)
+        return items[0] if items else None
+
+    def get_case_status(self, case_id: str) -> Optional[str]:
+        item = self._header_fields(case_id, "status", "c.status")
+        return item.get('status', 'unknown') if item else None
+
+    def get_case_files(self, case_id: str) -> Optional[List[str]]:
+        item = self._header_fields(case_id, "file_list", "c.files")
+        return list(item.get('files', [])) if item else None
+
+    def get_index_version(self, case_id: str) -> Optional[int]:
+        item = self._header_fields(case_id, "index_version", "c.index_version")
+        return item.get('index_version', 0) if item else None
+
+    def bump_index_version(self, case_id: str) -> Dict[str, Any]:
+        return self._patch_case(case_id, [{"op": "incr", "path": "/index_version", "value": 1}])
+
+    def _patch_case(self, case_id: str, operations: List[Dict[str, Any]], etag: Optional[str] = None) -> Dict[str, Any]:
+        # A single patch is atomic
+        if len(operations) > MAX_PATCH_OPERATIONS:
+            raise ValueError(f"A case patch takes at most {MAX_PATCH_OPERATIONS} operations, got {len(operations)}.")
+        kwargs = {"etag": etag, "match_condition": MatchConditions.IfNotModified} if etag else {}
         try:
-            case = self.get_case(case_id)
+            updated_case = self.container.patch_item(
+                item=case_id,
+                partition_key=case_id,
+                patch_operations=operations,
+                **kwargs
+            )
+            self._invalidate(case_id, case_list=True)
+            return updated_case
+        except CosmosHttpResponseError as e:
+            if e.status_code == 404:
+                if not etag and self._migrate_legacy_case(case_id):
+                    return self._patch_case(case_id, operations)
+                raise ValueError(f"Case with ID {case_id} not found.")
+            raise
+
+    def _update_case_with_retry(self, case_id: str,
+                                build_operations: Callable[[Dict[str, Any]], List[Dict[str, Any]]]) -> Dict[str, Any]:
+        # Blocking: call through asyncio.to_thread
+        for attempt in range(ETAG_RETRY_ATTEMPTS):
+            case = self._read_case_header(case_id)
             if not case:
                 raise ValueError(f"Case with ID {case_id} not found.")
-            
-            case.update(updates)
-            updated_case = self.container.replace_item(item=case_id, body=case)
-            return updated_case
+
+            operations = build_operations(case)
+            if not operations:
+                return case
+            try:
+                return self._patch_case(case_id, operations, etag=case['_etag'])
+            except CosmosHttpResponseError as e:
+                if e.status_code != 412:  # Precondition failed: another writer got there first
+                    raise
+                time.sleep(random.uniform(0, 0.05 * 2 ** attempt))
+        raise ValueError(f"Error updating case {case_id}: too many concurrent modifications.")
+
+    def update_case(self, case_id: str, updates: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            operations = [{"op": "set", "path": f"/{field}", "value": value} for field, value in updates.items()]
+            if len(operations) <= MAX_PATCH_OPERATIONS:
+                return self._patch_case(case_id, operations)
+            return self._replace_case_with_retry(case_id, updates)
         except CosmosHttpResponseError as e:
             raise ValueError(f"Error updating case: {str(e)}")
 
+    def _replace_case_with_retry(self, case_id: str, updates: Dict[str, Any]) -> Dict[str, Any]:
+        for attempt in range(ETAG_RETRY_ATTEMPTS):
+            case = self._read_case_header(case_id)
+            if not case:
+                raise ValueError(f"Case with ID {case_id} not found.")
+            case.update(updates)
+            try:
+                updated_case = self.container.replace_item(
+                    item=case_id, body=case, etag=case['_etag'], match_condition=MatchConditions.IfNotModified
+                )
+                self._invalidate(case_id, case_list=True)
+                return updated_case
+            except CosmosHttpResponseError as e:
+                if e.status_code != 412:
+                    raise
+                time.sleep(random.uniform(0, 0.05 * 2 ** attempt))
+        raise ValueError(f"Error updating case {case_id}: too many concurrent modifications.")
+
     def update_case_status(self, case_id: str, status: str) -> Dict[str, Any]:
         return self.update_case(case_id, {"status": status})
 
     def delete_case(self, case_id: str) -> None:
-        try:
-            self.container.delete_item(item=case_id, partition_key=case_id)
-        except CosmosHttpResponseError as e:
-            if e.status_code != 404:  # If it's not a "not found" error, raise it
-                raise
+        for item_id in self._query(case_id, "SELECT VALUE c.id FROM c"):
+            try:
+                self.container.delete_item(item=item_id, partition_key=case_id)
+            except CosmosHttpResponseError as e:
+                if e.status_code != 404:  # If it's not a "not found" error, raise it
+                    raise
+        if self.legacy_container is not None:
+            # Otherwise the case would be migrated back on its next access
+            try:
+                self.legacy_container.delete_item(item=case_id, partition_key=case_id)
+            except CosmosHttpResponseError as e:
+                if e.status_code != 404:
+                    raise
+        self._invalidate(case_id, case_list=True)
 
     def list_cases(self) -> List[Dict[str, Any]]:
-        query = "SELECT c.id, c.description, c.status FROM c"
-        items = list(self.container.query_items(
-            query=query,
-            enable_cross_partition_query=True
-        ))
-        return items
+        def load_cases() -> List[Dict[str, Any]]:
+            items = list(self.container.query_items(
+                query="SELECT c.id, c.description, c.status FROM c WHERE c.type = @type",
+                parameters=[{"name": "@type", "value": CASE_DOCUMENT}],
+                enable_cross_partition_query=True
+            ))
+            if self.legacy_container is not None:
+                known = {item["id"] for item in items}
+                items.extend(item for item in self.legacy_container.query_items(
+                    query="SELECT c.id, c.description, c.status FROM c WHERE NOT IS_DEFINED(c.type)",
+                    enable_cross_partition_query=True
+                ) if item["id"] not in known)
+            return items
+
+        return self._cached(CASE_LIST_SCOPE, "list", load_cases)
+
+    def add_file_to_case(self, case_id: str, file_info: Any) -> Dict[str, Any]:
+        def build_operations(case: Dict[str, Any]) -> List[Dict[str, Any]]:
+            bump_version = {"op": "incr", "path": "/index_version", "value": 1}
+            if file_info in case.get('files', []):
+                return [bump_version]
+            return [
+                {"op": "add", "path": "/files/-", "value": file_info},
+                {"op": "incr", "path": "/file_count", "value": 1},
+                bump_version
+            ]
 
-    def add_file_to_case(self, case_id: str, file_info: Dict[str, Any]) -> Dict[str, Any]:
         try:
-            case = self.get_case(case_id)
-            if not case:
-                raise ValueError(f"Case with ID {case_id} not found.")
-            
-            case['files'].append(file_info)
-            updated_case = self.container.replace_item(item=case_id, body=case)
-            return updated_case
+            return self._update_case_with_retry(case_id, build_operations)
         except CosmosHttpResponseError as e:
             raise ValueError(f"Error adding file to case: {str(e)}")
 
     def remove_file_from_case(self, case_id: str, file_name: str) -> Dict[str, Any]:
+        def build_operations(case: Dict[str, Any]) -> List[Dict[str, Any]]:
+            files = case.get('files', [])
+            if file_name not in files:
+                return []
+            return [
+                {"op": "remove", "path": f"/files/{files.index(file_name)}"},
+                {"op": "incr", "path": "/file_count", "value": -1},
+                {"op": "incr", "path": "/index_version", "value": 1}
+            ]
+
         try:
-            case = self.get_case(case_id)
-            if not case:
-                raise ValueError(f"Case with ID {case_id} not found.")
-            
-            case['files'] = [f for f in case['files'] if f['name'] != file_name]
-            updated_case = self.container.replace_item(item=case_id, body=case)
+            updated_case = self._update_case_with_retry(case_id, build_operations)
+            self._delete_items(case_id, [
+                self._file_item_id(case_id, file_name),
+                self._graph_item_id(case_id, file_name),
+                self._job_item_id(case_id, file_name)
+            ])
             return updated_case
         except CosmosHttpResponseError as e:
             raise ValueError(f"Error removing file from case: {str(e)}")
 
-    def update_graph(self, case_id: str, graph: Dict[str, Any]) -> Dict[str, Any]:
+    def delete_file_documents(self, case_id: str) -> None:
+        item_ids = self._query(
+            case_id,
+            "SELECT VALUE c.id FROM c WHERE c.type IN (@file, @graph, @job)",
+            file=FILE_DOCUMENT, graph=GRAPH_DOCUMENT, job=JOB_DOCUMENT
+        )
+        self._delete_items(case_id, item_ids)
+
+    def _delete_items(self, case_id: str, item_ids: List[str]) -> None:
+        for item_id in item_ids:
+            try:
+                self.container.delete_item(item=item_id, partition_key=case_id)
+            except CosmosHttpResponseError as e:
+                if e.status_code != 404:
+                    raise
+        self._invalidate(case_id)
+
+    def save_file_graph(self, case_id: str, filename: str, graph: Dict[str, Any]) -> Dict[str, Any]:
         try:
-            case = self.get_case(case_id)
-            if not case:
-                raise ValueError(f"Case with ID {case_id} not found.")
-            
-            case['graph'] = graph
-            updated_case = self.container.replace_item(item=case_id, body=case)
-            return updated_case
+            item = self.container.upsert_item(body={
+                "id": self._graph_item_id(case_id, filename),
+                "case_id": case_id,
+                "type": GRAPH_DOCUMENT,
+                "filename": filename,
+                "nodes": graph.get("nodes", []),
+                "relationships": graph.get("relationships", []),
+                "timecodes": graph.get("timecodes", {})
+            })
+            self._invalidate(case_id)
+            return item
         except CosmosHttpResponseError as e:
-            raise ValueError(f"Error updating graph for case: {str(e)}")
+            raise ValueError(f"Error saving graph for file {filename}: {str(e)}")
+
+    def update_graph(self, case_id: str, graph: Dict[str, Any]) -> None:
+        graph_ids = self._query(case_id, "SELECT VALUE c.id FROM c WHERE c.type = @type", type=GRAPH_DOCUMENT)
+        self._delete_items(case_id, graph_ids)
+        if graph.get("nodes") or graph.get("relationships"):
+            self.save_file_graph(case_id, "*", graph)
 
     def get_graph(self, case_id: str) -> Optional[Dict[str, Any]]:
-        case = self.get_case(case_id)
-        if case:
-            return case.get('graph')
-        return None
+        def load_graph() -> Dict[str, Any]:
+            graphs = self._query(
+                case_id,
+                "SELECT c.nodes, c.relationships, c.timecodes FROM c WHERE c.type = @type ORDER BY c.filename",
+                type=GRAPH_DOCUMENT
+            )
+            graph = KnowledgeGraph()
+            for file_graph in graphs:
+                graph.merge(file_graph)
+            return graph.to_dict()
+
+        return self._cached(case_id, "graph", load_graph)
 
     def add_summary_and_transcript(self, case_id: str, filename: str, summary: str, full_transcript: str):
         try:
-            case = self.get_case(case_id)
-            if not case:
-                raise ValueError(f"Case with ID {case_id} not found.")
-            
-            if 'summaries' not in case:
-                case['summaries'] = {}
-            case['summaries'][filename] = summary
-
-            if 'full_transcripts' not in case:
-                case['full_transcripts'] = {}
-            case['full_transcripts'][filename] = full_transcript
-
-            updated_case = self.container.replace_item(item=case_id, body=case)
-            return updated_case
+            item = self.container.upsert_item(body={
+                "id": self._file_item_id(case_id, filename),
+                "case_id": case_id,
+                "type": FILE_DOCUMENT,
+                "filename": filename,
+                "summary": summary,
+                "full_transcript": full_transcript
+            })
+            self._invalidate(case_id)
+            return item
         except CosmosHttpResponseError as e:
             raise ValueError(f"Error adding summary and transcript to case: {str(e)}")
 
+    def get_files_info(self, case_id: str, offset: int = 0, limit: Optional[int] = None,
+                       include_transcripts: bool = True) -> Optional[List[Dict[str, Any]]]:
+        # Only files registered on the header count as ingested
+        registered = self.get_case_files(case_id)
+        if registered is None:
+            return None
+        if not registered:
+            return []
+
+        page = registered[offset:] if limit is None else registered[offset:offset + limit]
+        if not page:
+            return []
+        fields = "c.filename, c.summary, c.full_transcript" if include_transcripts else "c.filename, c.summary"
+        query = f"SELECT {fields} FROM c WHERE c.type = @type AND ARRAY_CONTAINS(@files, c.filename)"
+
+        def load() -> List[Dict[str, Any]]:
+            items = self._query(case_id, query, type=FILE_DOCUMENT, files=page)
+            position = {filename: i for i, filename in enumerate(page)}
+            return sorted(items, key=lambda item: position[item["filename"]])
+
+        return self._cached(case_id, "files_info", load, offset, limit, include_transcripts)
+
     def get_summary(self, case_id: str, filename: str) -> Optional[str]:
-        case = self.get_case(case_id)
-        if case and 'summaries' in case:
-            return case['summaries'].get(filename)
-        return None
+        items = self._cached(case_id, "summary", lambda: self._query(
+            case_id, "SELECT VALUE c.summary FROM c WHERE c.id = @id", id=self._file_item_id(case_id, filename)
+        ), filename)
+        return items[0] if items else None
 
     def get_full_transcript(self, case_id: str, filename: str) -> Optional[str]:
-        case = self.get_case(case_id)
-        if case and 'full_transcripts' in case:
-            return case['full_transcripts'].get(filename)
-        return None
\ No newline at end of file
+        items = self._cached(case_id, "full_transcript", lambda: self._query(
+            case_id, "SELECT VALUE c.full_transcript FROM c WHERE c.id = @id", id=self._file_item_id(case_id, filename)
+        ), filename)
+        return items[0] if items else None
+
+    def create_job(self, case_id: str, filename: str, stages: List[str], source_version: Optional[str],
+                   resumed_stages: Optional[Dict[str, Dict[str, Any]]] = None, attempt: int = 1) -> Dict[str, Any]:
+        resumed_stages = resumed_stages or {}
+        now = time.time()
+        try:
+            return self.container.upsert_item(body={
+                "id": self._job_item_id(case_id, filename),
+                "case_id": case_id,
+                "type": JOB_DOCUMENT,
+                "filename": filename,
+                "status": "running",
+                "source_version": source_version,
+                "attempt": attempt,
+                "started_at": now,
+                "updated_at": now,
+                "stages": {stage: resumed_stages.get(stage, {"status": "pending"}) for stage in stages}
+            })
+        except CosmosHttpResponseError as e:
+            raise ValueError(f"Error creating job for file {filename}: {str(e)}")
+
+    def update_job_stage(self, case_id: str, filename: str, stage: str, record: Dict[str, Any]) -> Dict[str, Any]:
+        return self.container.patch_item(
+            item=self._job_item_id(case_id, filename),
+            partition_key=case_id,
+            patch_operations=[
+                {"op": "set", "path": f"/stages/{stage}", "value": record},
+                {"op": "set", "path": "/updated_at", "value": time.time()}
+            ]
+        )
+
+    def finish_job(self, case_id: str, filename: str, status: str, duration_ms: int) -> Dict[str, Any]:
+        return self.container.patch_item(
+            item=self._job_item_id(case_id, filename),
+            partition_key=case_id,
+            patch_operations=[
+                {"op": "set", "path": "/status", "value": status},
+                {"op": "set", "path": "/duration_ms", "value": duration_ms},
+                {"op": "set", "path": "/updated_at", "value": time.time()}
+            ]
+        )
+
+    def get_job(self, case_id: str, filename: str) -> Optional[Dict[str, Any]]:
+        items = self._query(
+            case_id,
+            "SELECT c.filename, c.status, c.source_version, c.attempt, c.started_at, c.updated_at, c.duration_ms, c.stages FROM c WHERE c.id = @id",
+            id=self._job_item_id(case_id, filename)
+        )
+        return items[0] if items else None
+
+    def list_jobs(self, case_id: str) -> List[Dict[str, Any]]:
+        return self._query(
+            case_id,
+            "SELECT c.filename, c.status, c.source_version, c.attempt, c.started_at, c.updated_at, c.duration_ms, c.stages FROM c WHERE c.type = @type",
+            type=JOB_DOCUMENT
+        )
+
+    def list_pending_ingestions(self) -> List[Dict[str, Any]]:
+        return list(self.container.query_items(
+            query="SELECT c.case_id, c.filename FROM c WHERE c.type = @type AND c.stages.search_index.status = @status",
+            parameters=[{"name": "@type", "value": JOB_DOCUMENT}, {"name": "@status", "value": "scheduled"}],
+            enable_cross_partition_query=True
+        ))
+
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    # python -m integration.cosmos_db migrates every legacy case up front
+    migrated = CosmosDB().migrate_legacy_cases()
+    logger.info(f"Migrated {migrated} legacy cases")
@@ -0,0 +1,101 @@
+import re
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+RelationshipKey = Tuple[str, str, str]
+
+
+def entity_key(entity_id: Any) -> str:
+    return re.sub(r"[\W_]+", "_", str(entity_id)).strip("_").casefold()
+
+
+class KnowledgeGraph:
+    def __init__(self):
+        self.nodes: Dict[str, Dict[str, Any]] = {}
+        self.relationships: Dict[RelationshipKey, Dict[str, Any]] = {}
+        self.timecodes: Dict[str, set] = {}
+
+    @classmethod
+    def from_dict(cls, graph: Optional[Dict[str, Any]]) -> "KnowledgeGraph":
+        knowledge_graph = cls()
+        if graph:
+            knowledge_graph.merge(graph)
+        return knowledge_graph
+
+    def canonical_id(self, entity_id: Any) -> Any:
+        node = self.nodes.get(entity_key(entity_id))
+        return node["id"] if node else entity_id
+
+    def canonicalize(self, graph: Dict[str, Any]) -> Dict[str, Any]:
+        nodes = [{**node, "id": self.canonical_id(node["id"])} if isinstance(node, dict) and "id" in node else node
+                 for node in graph.get("nodes", [])]
+        relationships = [
+            {**rel, "source": self.canonical_id(rel["source"]), "target": self.canonical_id(rel["target"])}
+            if isinstance(rel, dict) and "source" in rel and "target" in rel else rel
+            for rel in graph.get("relationships", [])
+        ]
+        timecodes: Dict[str, List[str]] = {}
+        for entity, times in graph.get("timecodes", {}).items():
+            timecodes.setdefault(self.canonical_id(entity), []).extend(times)
+        return {**graph, "nodes": nodes, "relationships": relationships, "timecodes": timecodes}
+
+    def merge(self, graph: Dict[str, Any]) -> Dict[str, Any]:
+        delta = {"nodes": [], "relationships": [], "timecodes": {}}
+
+        for node in graph.get("nodes", []):
+            if not isinstance(node, dict) or "id" not in node:
+                logger.warning(f"Skipping invalid node: {node}")
+                continue
+            key = entity_key(node["id"])
+            existing = self.nodes.get(key)
+            if existing is None:
+                existing = {**node, "properties": dict(node.get("properties") or {})}
+                self.nodes[key] = existing
+                delta["nodes"].append(existing)
+                continue
+            changed = False
+            for prop, value in (node.get("properties") or {}).items():
+                if prop not in existing["properties"]:
+                    existing["properties"][prop] = value
+                    changed = True
+            if not existing.get("type") and node.get("type"):
+                existing["type"] = node["type"]
+                changed = True
+            if changed:
+                delta["nodes"].append(existing)
+
+        for rel in graph.get("relationships", []):
+            if not (isinstance(rel, dict) and all(key in rel for key in ["source", "target", "type"])):
+                logger.warning(f"Skipping invalid relationship: {rel}")
+                continue
+            rel = {**rel, "source": self.canonical_id(rel["source"]), "target": self.canonical_id(rel["target"])}
+            rel_key = (entity_key(rel["source"]), entity_key(rel["target"]), rel["type"])
+            if rel_key not in self.relationships:
+                self.relationships[rel_key] = rel
+                delta["relationships"].append(rel)
+
+        for entity, times in graph.get("timecodes", {}).items():
+            entity = self.canonical_id(entity)
+            known = self.timecodes.setdefault(entity, set())
+            new_times = set(times) - known
+            if new_times:
+                known.update(new_times)
+                delta["timecodes"][entity] = sorted(new_times)
+
+        return delta
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "nodes": list(self.nodes.values()),
+            "relationships": list(self.relationships.values()),
+            "timecodes": {entity: sorted(times) for entity, times in self.timecodes.items()}
+        }
+
+
+def merge_graphs(graphs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    knowledge_graph = KnowledgeGraph()
+    for graph in graphs:
+        knowledge_graph.merge(graph)
+    return knowledge_graph.to_dict()
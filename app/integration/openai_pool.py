@@ -0,0 +1,313 @@
+import os
+import time
+import random
+import asyncio
+import logging
+import threading
+import weakref
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+import requests
+from requests.adapters import HTTPAdapter
+from openai import APIConnectionError, APIStatusError, AsyncAzureOpenAI, RateLimitError
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+PRIORITIES = (INTERACTIVE, BATCH)
+
+MAX_WAIT_SLICE_SECONDS = 1.0
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def parse_deployment_limits(value: str) -> Dict[str, Tuple[int, int]]:
+    # "gpt-4o=150000/900,whisper=0/3" -> {deployment: (tokens per minute, requests per minute)}
+    limits = {}
+    for entry in filter(None, (part.strip() for part in value.split(","))):
+        name, _, rates = entry.partition("=")
+        tpm, _, rpm = rates.partition("/")
+        limits[name.strip()] = (int(tpm or 0), int(rpm or 0))
+    return limits
+
+
+def retry_after_seconds(headers: Any) -> Optional[float]:
+    if headers is None:
+        return None
+    for header in ("retry-after-ms", "retry-after"):
+        value = headers.get(header)
+        if value is None:
+            continue
+        try:
+            seconds = float(value)
+        except ValueError:
+            continue
+        return seconds / 1000 if header == "retry-after-ms" else seconds
+    return None
+
+
+class TokenBucket:
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.capacity <= 0
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, reserve: float, now: float) -> float:
+        if self.unlimited:
+            return 0.0
+        self._refill(now)
+        # A single request larger than the bucket would otherwise never fit
+        needed = min(amount, self.capacity - reserve) + reserve
+        return max(needed - self.level, 0.0) / self.rate
+
+    def take(self, amount: float):
+        if not self.unlimited:
+            self.level -= amount
+
+    def give(self, amount: float):
+        if not self.unlimited:
+            self.level = min(self.capacity, self.level + amount)
+
+
+# Per-deployment token and request buckets; batch work yields to interactive requests
+class DeploymentScheduler:
+    def __init__(self, name: str, tokens_per_minute: int, requests_per_minute: int, interactive_reserve: float):
+        self.name = name
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.requests = TokenBucket(requests_per_minute)
+        self.interactive_reserve = interactive_reserve
+        self.lock = threading.Lock()
+        self.blocked_until = 0.0
+        self.queued = {priority: 0 for priority in PRIORITIES}
+        self.stats = {"in_flight": 0, "requests": 0, "throttled": 0, "tokens": 0, "wait_seconds": 0.0}
+
+    def _admit(self, tokens: int, priority: str) -> float:
+        with self.lock:
+            now = time.monotonic()
+            if now < self.blocked_until:
+                return self.blocked_until - now
+            if priority != INTERACTIVE and self.queued[INTERACTIVE]:
+                return 0.05
+            reserve = 0.0 if priority == INTERACTIVE else self.interactive_reserve
+            wait = max(
+                self.requests.wait_time(1, reserve * self.requests.capacity, now),
+                self.tokens.wait_time(tokens, reserve * self.tokens.capacity, now)
+            )
+            if wait > 0:
+                return wait
+            self.requests.take(1)
+            self.tokens.take(tokens)
+            self.stats["in_flight"] += 1
+            self.stats["requests"] += 1
+            return 0.0
+
+    def _queue(self, priority: str, delta: int, waited: float = 0.0):
+        with self.lock:
+            self.queued[priority] += delta
+            self.stats["wait_seconds"] += waited
+
+    async def acquire(self, tokens: int, priority: str = BATCH):
+        started = time.monotonic()
+        self._queue(priority, 1)
+        try:
+            while True:
+                wait = self._admit(tokens, priority)
+                if wait <= 0:
+                    return
+                await asyncio.sleep(min(wait, MAX_WAIT_SLICE_SECONDS))
+        finally:
+            self._queue(priority, -1, time.monotonic() - started)
+
+    def acquire_blocking(self, tokens: int, priority: str = INTERACTIVE):
+        started = time.monotonic()
+        self._queue(priority, 1)
+        try:
+            while True:
+                wait = self._admit(tokens, priority)
+                if wait <= 0:
+                    return
+                time.sleep(min(wait, MAX_WAIT_SLICE_SECONDS))
+        finally:
+            self._queue(priority, -1, time.monotonic() - started)
+
+    def release(self, reserved_tokens: int, used_tokens: Optional[int] = None):
+        with self.lock:
+            self.stats["in_flight"] -= 1
+            if used_tokens is not None:
+                self.stats["tokens"] += used_tokens
+                if used_tokens < reserved_tokens:
+                    self.tokens.give(reserved_tokens - used_tokens)
+                else:
+                    self.tokens.take(used_tokens - reserved_tokens)
+
+    def throttle(self, seconds: float):
+        with self.lock:
+            self.stats["throttled"] += 1
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self.lock:
+            stats = dict(self.stats)
+            stats["queued"] = dict(self.queued)
+            stats["tokens_per_minute"] = self.tokens.capacity
+            stats["requests_per_minute"] = self.requests.capacity
+            stats["blocked_for_seconds"] = max(self.blocked_until - time.monotonic(), 0.0)
+        return stats
+
+
+class OpenAIPool:
+    def __init__(self):
+        self.endpoint = os.getenv("OPENAI_API_BASE")
+        self.api_key = os.getenv("AOAI_API_KEY")
+        self.api_version = os.getenv("OPENAI_API_VERSION")
+        self.limits = parse_deployment_limits(os.getenv("OPENAI_DEPLOYMENT_LIMITS", ""))
+        self.default_limits = (int(os.getenv("OPENAI_DEFAULT_TPM", "0")), int(os.getenv("OPENAI_DEFAULT_RPM", "0")))
+        self.interactive_reserve = float(os.getenv("OPENAI_INTERACTIVE_RESERVE", "0.2"))
+        self.max_retries = int(os.getenv("OPENAI_MAX_RETRIES", "5"))
+        self.backoff_seconds = float(os.getenv("OPENAI_BACKOFF_SECONDS", "2"))
+        self.quota_share = float(os.getenv("OPENAI_QUOTA_SHARE", "1"))
+        self.lock = threading.Lock()
+        self.schedulers: Dict[str, DeploymentScheduler] = {}
+        self.clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, AsyncAzureOpenAI]]" = weakref.WeakKeyDictionary()
+
+        pool_size = int(os.getenv("OPENAI_HTTP_POOL_SIZE", "32"))
+        self.http_session = requests.Session()
+        self.http_session.mount("https://", HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size))
+
+    def client(self, api_version: Optional[str] = None) -> AsyncAzureOpenAI:
+        # httpx connection pools are bound to the loop that created them
+        api_version = api_version or self.api_version
+        loop = asyncio.get_running_loop()
+        with self.lock:
+            clients = self.clients.setdefault(loop, {})
+            if api_version not in clients:
+                clients[api_version] = AsyncAzureOpenAI(
+                    api_key=self.api_key,
+                    api_version=api_version,
+                    azure_endpoint=self.endpoint,
+                    max_retries=0
+                )
+            return clients[api_version]
+
+    def session(self) -> requests.Session:
+        return self.http_session
+
+    def scheduler(self, deployment: str) -> DeploymentScheduler:
+        with self.lock:
+            if deployment not in self.schedulers:
+                tpm, rpm = (self._share(limit) for limit in self.limits.get(deployment, self.default_limits))
+                self.schedulers[deployment] = DeploymentScheduler(deployment, tpm, rpm, self.interactive_reserve)
+            return self.schedulers[deployment]
+
+    def _share(self, limit: int) -> int:
+        return max(int(limit * self.quota_share), 1) if limit > 0 else 0
+
+    def _backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        if retry_after is not None:
+            return retry_after
+        return self.backoff_seconds * (2 ** (attempt - 1)) + random.uniform(0, 1)
+
+    async def run(self, deployment: str, call: Callable[[AsyncAzureOpenAI], Awaitable[T]], estimated_tokens: int = 0,
+                  priority: str = BATCH, api_version: Optional[str] = None, max_retries: Optional[int] = None) -> T:
+        scheduler = self.scheduler(deployment)
+        max_retries = self.max_retries if max_retries is None else max_retries
+        attempt = 0
+        while True:
+            await scheduler.acquire(estimated_tokens, priority)
+            used_tokens = None
+            try:
+                response = await call(self.client(api_version))
+                usage = getattr(response, "usage", None)
+                used_tokens = getattr(usage, "total_tokens", None)
+                return response
+            except RateLimitError as e:
+                # Rejected requests don't use quota
+                used_tokens = 0
+                attempt += 1
+                delay = self._backoff(attempt, retry_after_seconds(e.response.headers if e.response is not None else None))
+                scheduler.throttle(delay)
+                if attempt > max_retries:
+                    raise
+                logger.warning(f"{deployment} rate limited, retrying in {delay:.1f}s (attempt {attempt}/{max_retries})")
+            except (APIStatusError, APIConnectionError) as e:
+                used_tokens = 0
+                if isinstance(e, APIStatusError) and e.status_code < 500:
+                    raise
+                attempt += 1
+                if attempt > max_retries:
+                    raise
+                delay = self._backoff(attempt, None)
+                logger.warning(f"{deployment} request failed ({str(e)}), retrying in {delay:.1f}s (attempt {attempt}/{max_retries})")
+                await asyncio.sleep(delay)
+            finally:
+                scheduler.release(estimated_tokens, used_tokens)
+
+    def run_sync(self, deployment: str, call: Callable[[requests.Session], requests.Response], estimated_tokens: int = 0,
+                 priority: str = INTERACTIVE, max_retries: Optional[int] = None) -> requests.Response:
+        scheduler = self.scheduler(deployment)
+        max_retries = self.max_retries if max_retries is None else max_retries
+        attempt = 0
+        while True:
+            scheduler.acquire_blocking(estimated_tokens, priority)
+            try:
+                response = call(self.http_session)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                scheduler.release(estimated_tokens, 0)
+                attempt += 1
+                if attempt > max_retries:
+                    raise
+                delay = self._backoff(attempt, None)
+                logger.warning(f"{deployment} request failed ({str(e)}), retrying in {delay:.1f}s (attempt {attempt}/{max_retries})")
+                time.sleep(delay)
+                continue
+            except Exception:
+                scheduler.release(estimated_tokens, 0)
+                raise
+
+            retryable = response.status_code == 429 or response.status_code >= 500
+            scheduler.release(estimated_tokens, 0 if retryable else None)
+            if not retryable or attempt >= max_retries:
+                return response
+            attempt += 1
+            delay = self._backoff(attempt, retry_after_seconds(response.headers))
+            response.close()
+            if response.status_code == 429:
+                scheduler.throttle(delay)
+                logger.warning(f"{deployment} rate limited, retrying in {delay:.1f}s (attempt {attempt}/{max_retries})")
+            else:
+                logger.warning(f"{deployment} returned {response.status_code}, retrying in {delay:.1f}s (attempt {attempt}/{max_retries})")
+                time.sleep(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            schedulers = list(self.schedulers.values())
+        return {scheduler.name: scheduler.get_stats() for scheduler in schedulers}
+
+
+_pool: Optional[OpenAIPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_openai_pool() -> OpenAIPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = OpenAIPool()
+        return _pool
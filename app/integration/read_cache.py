@@ -0,0 +1,131 @@
+import copy
+import time
+import threading
+import contextlib
+from collections import OrderedDict
+from contextvars import ContextVar, Token
+from typing import Any, Callable, Dict, Hashable, Iterator, Optional, Set, Tuple
+
+CacheKey = Tuple[Hashable, ...]
+
+_MISSING = object()
+
+
+# Per-request memo plus a TTL'd LRU shared by the threads of one process
+class ReadThroughCache:
+    def __init__(self, ttl_seconds: float = 0, max_entries: int = 1024, copy_values: bool = True):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.copy_values = copy_values
+        self.lock = threading.Lock()
+        self.entries: "OrderedDict[CacheKey, Tuple[float, Any]]" = OrderedDict()
+        self.keys_by_scope: Dict[Hashable, Set[CacheKey]] = {}
+        self.request_memo: ContextVar[Optional[Dict[CacheKey, Any]]] = ContextVar("request_memo", default=None)
+        self.stats = {"request_hits": 0, "shared_hits": 0, "misses": 0, "invalidations": 0, "evictions": 0}
+
+    @property
+    def shared_enabled(self) -> bool:
+        return self.ttl_seconds > 0 and self.max_entries > 0
+
+    def begin_request_scope(self) -> Token:
+        return self.request_memo.set({})
+
+    def end_request_scope(self, token: Optional[Token]) -> None:
+        if token is not None:
+            self.request_memo.reset(token)
+
+    @contextlib.contextmanager
+    def request_scope(self) -> Iterator[None]:
+        token = self.begin_request_scope()
+        try:
+            yield
+        finally:
+            self.end_request_scope(token)
+
+    def get_or_load(self, key: CacheKey, loader: Callable[[], Any]) -> Any:
+        memo = self.request_memo.get()
+        if memo is not None and key in memo:
+            self._count("request_hits")
+            return self._copy(memo[key])
+
+        value = self._get_shared(key)
+        if value is not _MISSING:
+            self._count("shared_hits")
+        else:
+            self._count("misses")
+            value = loader()
+            self._put_shared(key, value)
+
+        if memo is not None:
+            memo[key] = value
+        return self._copy(value)
+
+    def get(self, key: CacheKey) -> Optional[Any]:
+        value = self._get_shared(key)
+        if value is _MISSING:
+            self._count("misses")
+            return None
+        self._count("shared_hits")
+        return self._copy(value)
+
+    def put(self, key: CacheKey, value: Any) -> None:
+        self._put_shared(key, value)
+
+    def _copy(self, value: Any) -> Any:
+        return copy.deepcopy(value) if self.copy_values else value
+
+    def invalidate(self, scope: Hashable) -> None:
+        memo = self.request_memo.get()
+        if memo is not None:
+            for key in [key for key in memo if key[0] == scope]:
+                del memo[key]
+        with self.lock:
+            for key in self.keys_by_scope.pop(scope, set()):
+                self.entries.pop(key, None)
+            self.stats["invalidations"] += 1
+
+    def _get_shared(self, key: CacheKey) -> Any:
+        if not self.shared_enabled:
+            return _MISSING
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return _MISSING
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                return _MISSING
+            self.entries.move_to_end(key)
+            return value
+
+    def _put_shared(self, key: CacheKey, value: Any) -> None:
+        if not self.shared_enabled:
+            return
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self.entries.move_to_end(key)
+            self.keys_by_scope.setdefault(key[0], set()).add(key)
+            while len(self.entries) > self.max_entries:
+                oldest = next(iter(self.entries))
+                self._remove(oldest)
+                self.stats["evictions"] += 1
+
+    def _remove(self, key: CacheKey) -> None:
+        self.entries.pop(key, None)
+        scope_keys = self.keys_by_scope.get(key[0])
+        if scope_keys is not None:
+            scope_keys.discard(key)
+            if not scope_keys:
+                del self.keys_by_scope[key[0]]
+
+    def _count(self, stat: str) -> None:
+        with self.lock:
+            self.stats[stat] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self.lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self.entries)
+        lookups = stats["request_hits"] + stats["shared_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["request_hits"] + stats["shared_hits"]) / lookups if lookups else 0.0
+        return stats
@@ -1,14 +1,29 @@
 import os
-from typing import Dict, Any, List
+import logging
+from typing import Dict, Any, Callable, Iterator, List, Optional, Tuple
 from flask import Response
+import json
 import requests
 from dotenv import load_dotenv
+from integration.openai_pool import INTERACTIVE, estimate_tokens, get_openai_pool
+from query.response_cache import ChatResponseCache
+from query.local_retrieval import get_local_retriever, local_retrieval_enabled
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+LOCAL_GROUNDING_PROMPT = (
+    "You are an assistant answering questions about the recordings of an investigation case. "
+    "Answer only from the transcript segments below and reference them as [doc1], [doc2], ... "
+    "If the answer can't be found in the segments, say that the information isn't available.\n\n"
+)
+
 class ChatService:
     def __init__(self):
         self.config = self.get_openai_config()
+        self.openai_pool = get_openai_pool()
+        self.response_cache = ChatResponseCache()
 
     @staticmethod
     def get_openai_config() -> Dict[str, str]:
@@ -38,8 +53,6 @@ class ChatService:
             "stream": is_streaming,
             "max_tokens": max_tokens,
         }
-        print (payload)
-        print (data_sources)
 
         if data_sources:
             payload.update({
@@ -47,42 +60,134 @@ class ChatService:
             })
         return payload
 
-    def chat_with_data(self, data: Dict[str, Any], case_id) -> Response:
+    def _chat_url(self) -> str:
+        return f"{self.config['OPENAI_ENDPOINT']}/openai/deployments/{self.config['AZURE_OPENAI_DEPLOYMENT_ID']}/chat/completions?api-version=2024-02-15-preview"
+
+    def _headers(self) -> Dict[str, str]:
+        return {
+            "Content-Type": "application/json",
+            "api-key": self.config['AOAI_API_KEY']
+        }
+
+    def _cache_kind(self, kind: str) -> str:
+        return f"local-{kind}" if local_retrieval_enabled() else kind
+
+    def ground_locally(self, messages: List[Dict[str, Any]], case_id: str) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        query = next((message.get("content", "") for message in reversed(messages) if message.get("role") == "user"), "")
+        documents = get_local_retriever().search(case_id, query) if query else []
+        citations = [
+            {
+                "content": document["text"],
+                "title": document["id"],
+                "filepath": document["id"],
+                "url": f"local://{case_id}-ingestion/{document['id']}"
+            }
+            for document in documents
+        ]
+        sources = "\n".join(f"[doc{i + 1}] {document['id']}\n{document['text']}" for i, document in enumerate(documents))
+        grounded = [{"role": "system", "content": LOCAL_GROUNDING_PROMPT + sources}]
+        grounded.extend({"role": message["role"], "content": message.get("content", "")}
+                        for message in messages if message.get("role") in ("user", "assistant"))
+        return grounded, citations
+
+    def chat_with_data(self, data: Dict[str, Any], case_id, index_version: Optional[int] = None) -> Response:
         messages = data
         index_name = case_id + "-ingestion"
 
         if not messages or not index_name:
             return {"error": "Messages and index name are required"}, 400
 
-        url = f"{self.config['OPENAI_ENDPOINT']}/openai/deployments/{self.config['AZURE_OPENAI_DEPLOYMENT_ID']}/chat/completions?api-version=2024-02-15-preview"
-        headers = {
-            "Content-Type": "application/json",
-            "api-key": self.config['AOAI_API_KEY']
-        }
-        
-        index_name = case_id + "-ingestion"
-        data_source = self.create_data_source(index_name)
-        print (data_source)
-        payload = self.create_payload(messages, [data_source], False) 
-        print (payload)
-        
-        response = requests.post(url, headers=headers, json=payload)
+        kind = self._cache_kind("completion")
+        cached = self.response_cache.get(case_id, index_version, kind, messages)
+        if cached is not None:
+            return cached
+
+        citations = None
+        if local_retrieval_enabled():
+            grounded, citations = self.ground_locally(messages, case_id)
+            payload = self.create_payload(grounded, None, False)
+        else:
+            data_source = self.create_data_source(index_name)
+            payload = self.create_payload(messages, [data_source], False)
+
+        response = self._post(self._chat_url(), self._headers(), payload)
         response.raise_for_status()
-        print (response.json())
-        return response.json()
+        result = response.json()
+        if citations is not None:
+            for choice in result.get("choices", []):
+                choice.setdefault("message", {})["context"] = {"citations": citations, "intent": None}
+        self.response_cache.put(case_id, index_version, kind, messages, result)
+        return result
+
+    def stream_chat_with_data(self, messages: List[Dict[str, Any]], case_id: str,
+                              index_version: Optional[int] = None) -> Iterator[str]:
+        kind = self._cache_kind("stream")
+        cached = self.response_cache.get(case_id, index_version, kind, messages)
+        if cached is not None:
+            yield json.dumps({"type": "delta", "content": cached["content"]}) + "\n"
+            yield json.dumps({"type": "citations", "citations": cached["citations"], "intent": cached["intent"]}) + "\n"
+            yield json.dumps({"type": "done", "cached": True}) + "\n"
+            return
+
+        citations: List[Dict[str, Any]] = []
+        if local_retrieval_enabled():
+            grounded, citations = self.ground_locally(messages, case_id)
+            payload = self.create_payload(grounded, None, True)
+        else:
+            data_source = self.create_data_source(case_id + "-ingestion")
+            payload = self.create_payload(messages, [data_source], True)
+
+        def cache_answer(answer: Dict[str, Any]):
+            self.response_cache.put(case_id, index_version, kind, messages, answer)
+
+        yield from self._stream_generator(payload, citations, cache_answer)
+
+    def _post(self, url: str, headers: Dict[str, str], payload: Dict[str, Any], stream: bool = False) -> requests.Response:
+        estimated_tokens = estimate_tokens(json.dumps(payload.get("messages", []))) + payload.get("max_tokens", 0)
+        return self.openai_pool.run_sync(
+            self.config['AZURE_OPENAI_DEPLOYMENT_ID'],
+            lambda session: session.post(url, headers=headers, json=payload, stream=stream),
+            estimated_tokens=estimated_tokens,
+            priority=INTERACTIVE
+        )
+
+    def stream_response(self, payload: Dict[str, Any]) -> Response:
+        return Response(self._stream_generator(payload), content_type='application/x-ndjson',
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
-    def stream_response(self, url: str, headers: Dict[str, str], payload: Dict[str, Any]) -> Response:
-        return Response(self._stream_generator(url, headers, payload), content_type='application/x-ndjson')
+    def _stream_generator(self, payload: Dict[str, Any], citations: Optional[List[Dict[str, Any]]] = None,
+                          on_complete: Optional[Callable[[Dict[str, Any]], None]] = None) -> Iterator[str]:
+        # Relays the SSE stream as NDJSON delta, citations and done events
+        citations = list(citations or [])
+        content: List[str] = []
+        intent = None
 
-    def _stream_generator(self, url: str, headers: Dict[str, str], payload: Dict[str, Any]):
         try:
-            with requests.post(url, headers=headers, json=payload, stream=True) as response:
+            with self._post(self._chat_url(), self._headers(), payload, stream=True) as response:
                 response.raise_for_status()
                 for line in response.iter_lines():
-                    if line:
-                        yield line.decode('utf-8') + "\n"
-        except requests.RequestException as e:
-            yield f"{{\"error\": \"Failed to retrieve response: {str(e)}\"}}\n"
+                    if not line or not line.startswith(b"data:"):
+                        continue
+                    data = line[len(b"data:"):].strip()
+                    if data == b"[DONE]":
+                        break
+                    for choice in json.loads(data).get("choices", []):
+                        delta = choice.get("delta") or {}
+                        context = delta.get("context") or {}
+                        citations.extend(context.get("citations") or [])
+                        intent = context.get("intent", intent)
+                        if delta.get("content"):
+                            content.append(delta["content"])
+                            yield json.dumps({"type": "delta", "content": delta["content"]}) + "\n"
+        except (requests.RequestException, ValueError) as e:
+            logger.error(f"Error streaming chat completion: {str(e)}")
+            yield json.dumps({"type": "error", "error": f"Failed to retrieve response: {str(e)}"}) + "\n"
+            return
+
+        if on_complete:
+            on_complete({"content": "".join(content), "citations": citations, "intent": intent})
+        yield json.dumps({"type": "citations", "citations": citations, "intent": intent}) + "\n"
+        yield json.dumps({"type": "done"}) + "\n"
 
     def refine_message(self, data: Dict[str, Any]) -> Response:
         message = data.get("message")
@@ -93,18 +198,11 @@ class ChatService:
         if not citations or not message or not index_name or not original_question:
             return {"error": "Message, citations, index name, and original question are required"}, 400
 
-        url = f"{self.config['OPENAI_ENDPOINT']}/openai/deployments/{self.config['AZURE_OPENAI_DEPLOYMENT_ID']}/chat/completions?api-version=2024-02-15-preview"
-        headers = {
-            "Content-Type": "application/json",
-            "api-key": self.config['AOAI_API_KEY']
-        }
-
         refine_messages = self.create_refine_messages(message, citations, original_question)
         data_source = self.create_data_source(index_name)
-        payload = self.create_payload(refine_messages, {}, {}, [data_source], True)
-        print (payload)
+        payload = self.create_payload(refine_messages, [data_source], True)
 
-        return self.stream_response(url, headers, payload)
+        return self.stream_response(payload)
 
     def create_refine_messages(self, message: str, citations: List[Dict[str, Any]], original_question: str) -> List[Dict[str, Any]]:
         system_message = (
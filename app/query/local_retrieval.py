@@ -0,0 +1,297 @@
+import os
+import re
+import json
+import math
+import zlib
+import fcntl
+import shutil
+import contextlib
+import logging
+import threading
+from collections import Counter, OrderedDict
+from typing import Any, Dict, List, Optional
+import numpy as np
+from dotenv import load_dotenv
+from integration.openai_pool import BATCH, INTERACTIVE, estimate_tokens, get_openai_pool
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r"\w+")
+BM25_K1 = 1.2
+BM25_B = 0.75
+EMBEDDING_BATCH_SIZE = 16
+
+DOCUMENTS_FILE = "documents.jsonl"
+VECTORS_FILE = "vectors.f32"
+META_FILE = "meta.json"
+LOCK_FILE = ".lock"
+
+
+def local_retrieval_enabled() -> bool:
+    return os.getenv("RETRIEVAL_BACKEND", "azure_search") == "local"
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.casefold())
+
+
+class HashingEmbedder:
+    # Feature hashing over unigrams and bigrams
+    def __init__(self, dimensions: int):
+        self.dimensions = dimensions
+        self.name = f"hashing-{dimensions}"
+
+    def embed(self, texts: List[str], priority: str = BATCH) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            tokens = tokenize(text)
+            features = Counter(tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])])
+            for feature, count in features.items():
+                digest = zlib.crc32(feature.encode("utf-8"))
+                sign = 1.0 if digest & 0x80000000 else -1.0
+                vectors[row, digest % self.dimensions] += sign * (1.0 + math.log(count))
+        return vectors
+
+
+class AzureOpenAIEmbedder:
+    def __init__(self):
+        self.deployment = os.getenv("EMBEDDING_MODEL_DEPLOYMENT_NAME")
+        self.url = f"{os.getenv('OPENAI_API_BASE')}/openai/deployments/{self.deployment}/embeddings?api-version={os.getenv('OPENAI_API_VERSION')}"
+        self.headers = {"Content-Type": "application/json", "api-key": os.getenv("AOAI_API_KEY", "")}
+        self.name = f"aoai-{self.deployment}"
+        self.openai_pool = get_openai_pool()
+
+    def embed(self, texts: List[str], priority: str = BATCH) -> np.ndarray:
+        rows = []
+        for start in range(0, len(texts), EMBEDDING_BATCH_SIZE):
+            batch = texts[start:start + EMBEDDING_BATCH_SIZE]
+            response = self.openai_pool.run_sync(
+                self.deployment,
+                lambda session: session.post(self.url, headers=self.headers, json={"input": batch}),
+                estimated_tokens=sum(estimate_tokens(text) for text in batch),
+                priority=priority
+            )
+            response.raise_for_status()
+            rows.extend(item["embedding"] for item in sorted(response.json()["data"], key=lambda item: item["index"]))
+        return np.asarray(rows, dtype=np.float32).reshape(len(texts), -1)
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+# Hybrid BM25 + vector index over one case, shared between processes through a flock
+class CaseIndex:
+    def __init__(self, directory: str, embedder: Any):
+        self.directory = directory
+        self.embedder = embedder
+        self.lock = threading.RLock()
+        self.loaded_size = -1
+        self._reset()
+
+    def _reset(self):
+        self.documents: List[Dict[str, Any]] = []
+        self.postings: Dict[str, List[List[int]]] = {}
+        self.lengths: List[int] = []
+        self.vectors: Optional[np.ndarray] = None
+        self.dimensions: Optional[int] = None
+        self.incompatible = False
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    @contextlib.contextmanager
+    def _file_lock(self, exclusive: bool):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self._path(LOCK_FILE), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _documents_size(self) -> int:
+        try:
+            return os.path.getsize(self._path(DOCUMENTS_FILE))
+        except OSError:
+            return 0
+
+    def _ensure_loaded(self):
+        if self._documents_size() != self.loaded_size:
+            self._load()
+
+    def _load(self):
+        self._reset()
+        self.loaded_size = self._documents_size()
+        try:
+            with open(self._path(META_FILE)) as meta_file:
+                meta = json.load(meta_file)
+        except (OSError, ValueError):
+            return
+        if meta.get("embedder") != self.embedder.name:
+            # Vectors from another embedder can't be compared; dropped by the next write
+            logger.warning(f"Ignoring index in {self.directory} built with {meta.get('embedder')}, now using {self.embedder.name}")
+            self.incompatible = True
+            return
+        self.dimensions = meta["dimensions"]
+
+        with open(self._path(DOCUMENTS_FILE), encoding="utf-8") as documents_file:
+            documents = [json.loads(line) for line in documents_file if line.strip()]
+        rows = os.path.getsize(self._path(VECTORS_FILE)) // (4 * self.dimensions)
+        count = min(len(documents), rows)
+        if count:
+            self.vectors = np.memmap(self._path(VECTORS_FILE), dtype=np.float32, mode="r", shape=(count, self.dimensions))
+        for document in documents[:count]:
+            self._index_terms(document)
+
+    def _index_terms(self, document: Dict[str, Any]):
+        doc_index = len(self.documents)
+        self.documents.append(document)
+        counts = Counter(tokenize(document["text"]))
+        self.lengths.append(sum(counts.values()))
+        for term, count in counts.items():
+            self.postings.setdefault(term, []).append([doc_index, count])
+
+    def _write_meta(self):
+        with open(self._path(META_FILE), "w") as meta_file:
+            json.dump({"embedder": self.embedder.name, "dimensions": self.dimensions}, meta_file)
+
+    def add_file(self, file_id: str, documents: Dict[str, str]):
+        names = list(documents)
+        vectors = normalize_rows(self.embedder.embed([documents[name] for name in names])) if names else None
+        with self.lock, self._file_lock(exclusive=True):
+            self._ensure_loaded()
+            if self.incompatible:
+                for name in (DOCUMENTS_FILE, VECTORS_FILE, META_FILE):
+                    if os.path.exists(self._path(name)):
+                        os.remove(self._path(name))
+                self._load()
+            if any(document["file_id"] == file_id for document in self.documents):
+                self._remove_file_locked(file_id)
+            if not names:
+                return
+
+            if self.dimensions is None:
+                self.dimensions = vectors.shape[1]
+                self._write_meta()
+            with open(self._path(VECTORS_FILE), "ab") as vectors_file:
+                vectors_file.write(vectors.astype(np.float32).tobytes())
+            with open(self._path(DOCUMENTS_FILE), "a", encoding="utf-8") as documents_file:
+                for name in names:
+                    documents_file.write(json.dumps({"id": name, "file_id": file_id, "text": documents[name]}) + "\n")
+            self._load()
+
+    def remove_file(self, file_id: str):
+        with self.lock, self._file_lock(exclusive=True):
+            self._ensure_loaded()
+            self._remove_file_locked(file_id)
+
+    def _remove_file_locked(self, file_id: str):
+        keep = [i for i, document in enumerate(self.documents) if document["file_id"] != file_id]
+        if len(keep) == len(self.documents):
+            return
+        temporary = {name: self._path(name + ".tmp") for name in (DOCUMENTS_FILE, VECTORS_FILE)}
+        with open(temporary[DOCUMENTS_FILE], "w", encoding="utf-8") as documents_file:
+            for i in keep:
+                documents_file.write(json.dumps(self.documents[i]) + "\n")
+        with open(temporary[VECTORS_FILE], "wb") as vectors_file:
+            if keep and self.vectors is not None:
+                vectors_file.write(np.asarray(self.vectors[keep], dtype=np.float32).tobytes())
+        for name, path in temporary.items():
+            os.replace(path, self._path(name))
+        self._load()
+
+    def delete(self):
+        with self.lock, self._file_lock(exclusive=True):
+            shutil.rmtree(self.directory, ignore_errors=True)
+            self.loaded_size = -1
+            self._reset()
+
+    def search(self, query: str, top_k: int, alpha: float) -> List[Dict[str, Any]]:
+        with self.lock:
+            if os.path.isdir(self.directory):
+                with self._file_lock(exclusive=False):
+                    self._ensure_loaded()
+            count = len(self.documents)
+            if not count or self.vectors is None:
+                return []
+
+            lexical = np.zeros(count, dtype=np.float32)
+            lengths = np.asarray(self.lengths, dtype=np.float32)
+            average_length = float(lengths.mean()) or 1.0
+            for term in set(tokenize(query)):
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                doc_indexes, counts = np.asarray(postings, dtype=np.int64).T
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                tf = counts.astype(np.float32)
+                lexical[doc_indexes] += idf * tf * (BM25_K1 + 1) / (
+                    tf + BM25_K1 * (1 - BM25_B + BM25_B * lengths[doc_indexes] / average_length)
+                )
+            if lexical.max() > 0:
+                lexical /= lexical.max()
+
+            query_vector = normalize_rows(self.embedder.embed([query], priority=INTERACTIVE))[0]
+            semantic = np.clip(np.asarray(self.vectors @ query_vector), 0, None)
+
+            scores = alpha * lexical + (1 - alpha) * semantic
+            top = np.argsort(-scores, kind="stable")[:top_k]
+            return [dict(self.documents[i], score=float(scores[i])) for i in top if scores[i] > 0]
+
+
+class LocalRetriever:
+    def __init__(self):
+        self.path = os.getenv("LOCAL_INDEX_PATH", ".cache/index")
+        self.top_k = int(os.getenv("LOCAL_RETRIEVAL_TOP_K", "5"))
+        self.alpha = float(os.getenv("LOCAL_RETRIEVAL_ALPHA", "0.5"))
+        self.max_open_indexes = int(os.getenv("LOCAL_INDEX_MAX_OPEN", "32"))
+        if os.getenv("LOCAL_EMBEDDINGS", "hashing") == "aoai":
+            self.embedder = AzureOpenAIEmbedder()
+        else:
+            self.embedder = HashingEmbedder(int(os.getenv("LOCAL_EMBEDDING_DIMENSIONS", "512")))
+        self.lock = threading.Lock()
+        self.indexes: "OrderedDict[str, CaseIndex]" = OrderedDict()
+
+    def _index(self, case_id: str) -> CaseIndex:
+        with self.lock:
+            index = self.indexes.get(case_id)
+            if index is None:
+                index = CaseIndex(os.path.join(self.path, case_id), self.embedder)
+                self.indexes[case_id] = index
+                while len(self.indexes) > self.max_open_indexes:
+                    self.indexes.popitem(last=False)
+            self.indexes.move_to_end(case_id)
+            return index
+
+    def index_file(self, case_id: str, file_id: str, documents: Dict[str, str]):
+        self._index(case_id).add_file(file_id, documents)
+        logger.info(f"Indexed {len(documents)} segments of {file_id} for case {case_id}")
+
+    def remove_file(self, case_id: str, file_id: str):
+        self._index(case_id).remove_file(file_id)
+
+    def delete_case(self, case_id: str):
+        index = self._index(case_id)
+        with self.lock:
+            self.indexes.pop(case_id, None)
+        index.delete()
+
+    def search(self, case_id: str, query: str, top_k: Optional[int] = None) -> List[Dict[str, Any]]:
+        return self._index(case_id).search(query, top_k or self.top_k, self.alpha)
+
+
+_retriever: Optional[LocalRetriever] = None
+_retriever_lock = threading.Lock()
+
+
+def get_local_retriever() -> LocalRetriever:
+    global _retriever
+    with _retriever_lock:
+        if _retriever is None:
+            _retriever = LocalRetriever()
+        return _retriever
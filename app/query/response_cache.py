@@ -0,0 +1,54 @@
+import os
+import re
+import json
+import hashlib
+from typing import Any, Dict, List, Optional
+from integration.read_cache import ReadThroughCache
+
+TRAILING_PUNCTUATION_PATTERN = re.compile(r"[\s?!.]+$")
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+def normalize_messages(messages: List[Dict[str, Any]]) -> List[List[str]]:
+    # Case, spacing and trailing punctuation don't change the answer
+    normalized = []
+    for message in messages:
+        content = message.get("content")
+        if not isinstance(content, str):
+            content = json.dumps(content, sort_keys=True)
+        content = WHITESPACE_PATTERN.sub(" ", content).strip().casefold()
+        normalized.append([str(message.get("role", "")), TRAILING_PUNCTUATION_PATTERN.sub("", content)])
+    return normalized
+
+
+class ChatResponseCache:
+    def __init__(self):
+        self.cache = ReadThroughCache(
+            ttl_seconds=float(os.getenv("CHAT_CACHE_TTL_SECONDS", "3600")),
+            max_entries=int(os.getenv("CHAT_CACHE_MAX_ENTRIES", "512"))
+        )
+
+    @staticmethod
+    def _key(case_id: str, index_version: int, kind: str, messages: List[Dict[str, Any]]) -> tuple:
+        digest = hashlib.sha256(json.dumps(normalize_messages(messages)).encode("utf-8")).hexdigest()
+        return (case_id, kind, index_version, digest)
+
+    def get(self, case_id: str, index_version: Optional[int], kind: str, messages: List[Dict[str, Any]]) -> Optional[Any]:
+        if index_version is None or not self.cache.shared_enabled:
+            return None
+        return self.cache.get(self._key(case_id, index_version, kind, messages))
+
+    def put(self, case_id: str, index_version: Optional[int], kind: str, messages: List[Dict[str, Any]], value: Any) -> None:
+        if index_version is None:
+            return
+        self.cache.put(self._key(case_id, index_version, kind, messages), value)
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self.cache.get_stats()
+        return {
+            "hits": stats["shared_hits"],
+            "misses": stats["misses"],
+            "hit_rate": stats["hit_rate"],
+            "entries": stats["entries"],
+            "evictions": stats["evictions"]
+        }
@@ -0,0 +1,117 @@
+import os
+import re
+import math
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, List, Optional, Tuple
+from ingestion.srt import Segment, SegmentTable, format_clock, parse_srt
+from integration.read_cache import ReadThroughCache
+
+TIMECODE_PATTERN = re.compile(r"^(.*)__min(\d+)_(\d+)$")
+DEFAULT_CONTEXT_MS = 15000
+MAX_WINDOW_MS = 30 * 60 * 1000
+
+
+def parse_timecode(timecode: str) -> Optional[Tuple[str, int]]:
+    # "interview.mp3__min02_15" -> ("interview.mp3", 135000)
+    match = TIMECODE_PATTERN.match(timecode)
+    if not match:
+        return None
+    filename, minutes, seconds = match.groups()
+    return filename, (int(minutes) * 60 + int(seconds)) * 1000
+
+
+def parse_offset(value: str) -> int:
+    # Seconds ("135", "135.5") or a clock ("02:15", "00:02:15.500"), in milliseconds
+    seconds = 0.0
+    for part in value.strip().replace(',', '.').split(':'):
+        seconds = seconds * 60 + float(part)
+    if not math.isfinite(seconds) or seconds < 0:
+        raise ValueError(f"Invalid offset: {value}")
+    return int(seconds * 1000)
+
+
+def segment_to_dict(segment: Segment) -> Dict[str, Any]:
+    return {"start_ms": segment.start_ms, "end_ms": segment.end_ms, "time": format_clock(segment.start_ms), "text": segment.text}
+
+
+# max_end_ms is the running max of cue ends, so it can be bisected
+class TranscriptIntervals:
+    __slots__ = ("table", "max_end_ms")
+
+    def __init__(self, table: SegmentTable):
+        self.table = table
+        self.max_end_ms = array("q")
+        latest = 0
+        for end_ms in table.end_ms:
+            latest = max(latest, end_ms)
+            self.max_end_ms.append(latest)
+
+    def overlapping(self, from_ms: int, to_ms: int) -> List[Segment]:
+        start = bisect_left(self.max_end_ms, from_ms)
+        stop = bisect_right(self.table.start_ms, to_ms)
+        return [self.table.segment(i) for i in range(start, stop) if self.table.end_ms[i] >= from_ms]
+
+
+class EntityPostings:
+    __slots__ = ("postings",)
+
+    def __init__(self, timecodes: Dict[str, List[str]]):
+        self.postings: Dict[str, List[Tuple[str, int]]] = {}
+        for entity, entity_timecodes in (timecodes or {}).items():
+            parsed = {parse_timecode(timecode) for timecode in entity_timecodes}
+            self.postings[entity] = sorted(posting for posting in parsed if posting is not None)
+
+    def mentions(self, entity: str) -> List[Tuple[str, int]]:
+        return self.postings.get(entity, [])
+
+
+# Indexes are cached per case index version
+class TimelineIndex:
+    def __init__(self, cosmos_db: Any):
+        self.cosmos_db = cosmos_db
+        self.cache = ReadThroughCache(
+            ttl_seconds=float(os.getenv("TIMELINE_CACHE_TTL_SECONDS", "3600")),
+            max_entries=int(os.getenv("TIMELINE_CACHE_MAX_ENTRIES", "256")),
+            # Read-only once built
+            copy_values=False
+        )
+
+    def _intervals(self, case_id: str, filename: str) -> Optional[TranscriptIntervals]:
+        def load() -> Optional[TranscriptIntervals]:
+            transcript = self.cosmos_db.get_full_transcript(case_id, filename)
+            return TranscriptIntervals(parse_srt(transcript, filename)) if transcript else None
+
+        version = self.cosmos_db.get_index_version(case_id)
+        return self.cache.get_or_load((case_id, "transcript", version, filename), load)
+
+    def _postings(self, case_id: str) -> EntityPostings:
+        def load() -> EntityPostings:
+            return EntityPostings((self.cosmos_db.get_graph(case_id) or {}).get("timecodes", {}))
+
+        version = self.cosmos_db.get_index_version(case_id)
+        return self.cache.get_or_load((case_id, "postings", version), load)
+
+    def transcript_window(self, case_id: str, filename: str, from_ms: int, to_ms: int) -> Optional[List[Dict[str, Any]]]:
+        intervals = self._intervals(case_id, filename)
+        if intervals is None:
+            return None
+        to_ms = min(to_ms, from_ms + MAX_WINDOW_MS)
+        return [segment_to_dict(segment) for segment in intervals.overlapping(from_ms, to_ms)]
+
+    def entity_mentions(self, case_id: str, entity: str, context_ms: int = DEFAULT_CONTEXT_MS) -> List[Dict[str, Any]]:
+        mentions = []
+        for filename, offset_ms in self._postings(case_id).mentions(entity):
+            intervals = self._intervals(case_id, filename)
+            segments = intervals.overlapping(max(offset_ms - context_ms, 0), offset_ms + context_ms) if intervals else []
+            mentions.append({
+                "filename": filename,
+                "timecode": f"{filename}__min{offset_ms // 60000:02d}_{offset_ms // 1000 % 60:02d}",
+                "offset_ms": offset_ms,
+                "segments": [segment_to_dict(segment) for segment in segments]
+            })
+        return mentions
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self.cache.get_stats()
+        return {"hits": stats["shared_hits"], "misses": stats["misses"], "entries": stats["entries"]}
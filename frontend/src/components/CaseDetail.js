@@ -271,6 +271,7 @@ const CaseDetail = () => {
       )}
       {activeTab === 'analysis' && processingStatus === 'completed' && (
         <GraphView 
+          caseId={id}
           graphData={caseData.graph} 
           onTimeClick={handleTimeClick}
         />
@@ -2,7 +2,6 @@ import React, { useState, useEffect, useRef } from 'react';
 import styled from 'styled-components';
 import { FontAwesomeIcon } from '@fortawesome/react-fontawesome';
 import { faPaperPlane } from '@fortawesome/free-solid-svg-icons';
-import axios from 'axios';
 
 const ChatContainer = styled.div`
   display: flex;
@@ -167,24 +166,45 @@ const ChatSection = ({ caseId, onCitationClick }) => {
     setInput('');
 
     try {
-      const response = await axios.post(`/api/cases/${caseId}/chat`, {
-        messages: [...messages, newMessage],
+      const response = await fetch(`/api/cases/${caseId}/chat/stream`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ messages: [...messages, newMessage] }),
       });
-      
-      if (response.data && response.data.choices && response.data.choices[0].message) {
-        const assistantMessage = response.data.choices[0].message;
-        if (assistantMessage.context && assistantMessage.context.citations) {
-          assistantMessage.context.citations = assistantMessage.context.citations.filter(citation => !citation.url.includes('full_transcript') && !citation.url.includes('summary'));
-        }
+      if (!response.ok || !response.body) {
+        throw new Error(`Chat request failed with status ${response.status}`);
+      }
 
-        setMessages(prevMessages => [
-          ...prevMessages,
-          {
-            role: 'assistant',
-            content: assistantMessage.content,
-            citations: assistantMessage.context?.citations || []
+      setMessages(prevMessages => [...prevMessages, { role: 'assistant', content: '', citations: [] }]);
+      const updateAssistantMessage = (update) => {
+        setMessages(prevMessages => {
+          const updated = [...prevMessages];
+          updated[updated.length - 1] = update(updated[updated.length - 1]);
+          return updated;
+        });
+      };
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split('\n');
+        buffer = lines.pop();
+        for (const line of lines) {
+          if (!line.trim()) continue;
+          const event = JSON.parse(line);
+          if (event.type === 'delta') {
+            updateAssistantMessage(message => ({ ...message, content: message.content + event.content }));
+          } else if (event.type === 'citations') {
+            const citations = (event.citations || []).filter(citation => citation.url && !citation.url.includes('full_transcript') && !citation.url.includes('summary'));
+            updateAssistantMessage(message => ({ ...message, citations }));
+          } else if (event.type === 'error') {
+            throw new Error(event.error);
           }
-        ]);
+        }
       }
     } catch (error) {
       console.error('Error sending message:', error);
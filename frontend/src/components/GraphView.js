@@ -1,4 +1,5 @@
 import React, { useEffect, useRef, useState } from 'react';
+import axios from 'axios';
 import styled from 'styled-components';
 import { Network, DataSet } from 'vis-network/standalone';
 
@@ -29,10 +30,40 @@ const TimeButton = styled.button`
   }
 `;
 
-const GraphView = ({ graphData, onTimeClick }) => {
+const MentionText = styled.p`
+  margin: 2px 0 8px;
+  font-size: 13px;
+  color: #555555;
+`;
+
+const GraphView = ({ caseId, graphData, onTimeClick }) => {
   const graphRef = useRef(null);
   const networkRef = useRef(null);
   const [selectedNode, setSelectedNode] = useState(null);
+  const [mentions, setMentions] = useState({});
+
+  useEffect(() => {
+    setMentions({});
+    if (!caseId || !selectedNode) {
+      return;
+    }
+    let cancelled = false;
+    // Only the cues around each mention, instead of the whole transcript
+    axios.get(`/api/cases/${caseId}/entities/${encodeURIComponent(selectedNode.id)}/mentions`)
+      .then(response => {
+        if (!cancelled) {
+          const byTimecode = {};
+          response.data.mentions.forEach(mention => {
+            byTimecode[mention.timecode] = mention.segments.map(segment => segment.text).join(' ');
+          });
+          setMentions(byTimecode);
+        }
+      })
+      .catch(error => console.error('Error fetching entity mentions:', error));
+    return () => {
+      cancelled = true;
+    };
+  }, [caseId, selectedNode]);
 
   useEffect(() => {
     if (graphRef.current && graphData) {
@@ -136,9 +167,12 @@ const GraphView = ({ graphData, onTimeClick }) => {
                 const [_, minutes, seconds] = timestamp.match(/min(\d+)_(\d+)/);
                 const formattedTime = `${minutes.padStart(2, '0')}:${seconds.padStart(2, '0')}`;
                 return (
-                  <TimeButton key={index} onClick={() => handleTimeClick(offset)}>
-                    {filename} - {formattedTime}
-                  </TimeButton>
+                  <div key={index}>
+                    <TimeButton onClick={() => handleTimeClick(offset)}>
+                      {filename} - {formattedTime}
+                    </TimeButton>
+                    {mentions[offset] && <MentionText>{mentions[offset]}</MentionText>}
+                  </div>
                 );
               })}
             </div>